@@ -1,156 +1,200 @@
+import hashlib
+import json
 import os
+from functools import cached_property
 import pandas as pd
 import streamlit as st
 import matplotlib.pyplot as plt
-import xml.etree.ElementTree as ET
-from pydantic import BaseModel
 import seaborn as sns
 from categories import categorize_apps
-
-class DataFrames(BaseModel):
-    screen_df: pd.DataFrame
-    heart_rate_df: pd.DataFrame
-    sleep_df: pd.DataFrame
-    audio_exposure_df: pd.DataFrame
-    sleep_grouped: pd.DataFrame
-    screen_grouped: pd.DataFrame
-    productivity_usage: pd.DataFrame
-    audio_grouped: pd.DataFrame
-
-    class Config:
-        arbitrary_types_allowed = True
-
-def ensure_utc(df, col):
+import healthkit
+from health_timeline import HealthTimeline, to_ns
+import screentime_store
+from sleep import night_of, sleep_nights
+
+HEALTHKIT_TYPES = (
+    'HKQuantityTypeIdentifierHeartRate',
+    'HKCategoryTypeIdentifierSleepAnalysis',
+    'HKQuantityTypeIdentifierHeadphoneAudioExposure',
+)
+HEART_RATE_TYPE = 'HKQuantityTypeIdentifierHeartRate'
+# Record attributes the pages use; the rest stay on disk in the HealthKit cache
+HEALTHKIT_COLUMNS = ('sourceName', 'unit', 'startDate', 'endDate', 'value')
+SCREEN_COLUMNS = ('app', 'usage', 'start_time', 'end_time', 'tz', 'device_id')
+DATA_DIR = "./data"
+# Most points drawn in a per-session scatter plot; larger frames are sampled down
+SCATTER_SAMPLE_SIZE = 5000
+
+def build_usage_cube(screen_df):
     """
-    Ensure all datetime column is in the specified DataFrames are in UTC timezone.
+    Aggregates screen time events into usage seconds and session counts per
+    (date, hour, app, category, parent_category).
     """
-    if df[col].dt.tz is None:
-        df[col] = df[col].dt.tz_localize('UTC')
-    df[col] = df[col].dt.tz_convert('UTC')
-
-def ensure_all_utc(dfs: list[pd.DataFrame], cols: list[str]):
+    return (
+        screen_df
+        .groupby(['date', 'hour', 'app', 'category', 'parent_category'], observed=True)
+        .agg(usage=('usage', 'sum'), sessions=('usage', 'size'))
+        .reset_index()
+    )
+
+def dataset_version(data_dir=DATA_DIR):
     """
-    Ensure all datetime columns in the specified DataFrames are in UTC timezone.
+    Cheap fingerprint of the inputs: name, size and mtime of the HealthKit export and the
+    Screen Time store parts. Costs a few stat calls, so it can run on every rerun.
     """
-    for df in dfs:
-        for col in cols:
-            try:
-                ensure_utc(df, col)
-            except:
-                continue
-
-@st.cache_resource
-def setup_data() -> DataFrames:
+    store_dir = os.path.join(data_dir, "screentime")
+    paths = [os.path.join(data_dir, file) for file in sorted(os.listdir(data_dir)) if file.endswith(".xml")]
+    if os.path.isdir(store_dir):
+        paths += [os.path.join(store_dir, file) for file in sorted(os.listdir(store_dir)) if file.endswith(".parquet")]
+    stats = [[path, os.stat(path).st_size, os.stat(path).st_mtime_ns] for path in paths]
+    return hashlib.sha1(json.dumps(stats).encode()).hexdigest()[:16]
+
+class DataFrames:
     """
-    Setup the data for analysis.
-    """
-    asleep_values = [1, 3, 4, 5]
-    data_dir = "./data"
-    # Paths to your data files
-    csv_files = [os.path.join(data_dir, file) for file in os.listdir(data_dir) if file.endswith(".csv")]
-    healthkit_export_xml = next((os.path.join(data_dir, file) for file in os.listdir(data_dir) if file.endswith(".xml")), None)
-
-    screentime_dfs = [parse_screentime_csv(csv_file) for csv_file in csv_files]
-    screen_df = pd.concat(screentime_dfs, ignore_index=True).drop_duplicates()
-    # Parse health data from the XML file
-    heart_rate_df = parse_healthkit_export(healthkit_export_xml, 'HKQuantityTypeIdentifierHeartRate')
-    sleep_df = parse_healthkit_export(healthkit_export_xml, 'HKCategoryTypeIdentifierSleepAnalysis')
-    audio_exposure_df = parse_healthkit_export(healthkit_export_xml, 'HKQuantityTypeIdentifierHeadphoneAudioExposure')
+    Inputs for the pages, each computed on first access and then memoized.
 
-    # Convert datetime columns and ensure they are in UTC
-    screen_df['start_time'] = pd.to_datetime(screen_df['start_time'])
-    screen_df['end_time'] = pd.to_datetime(screen_df['end_time'])
-
-    ensure_all_utc([screen_df, heart_rate_df, sleep_df, audio_exposure_df], ['startDate', 'endDate', "start_time", "end_time"])
+    A page only pays for the data it touches: the Screen Time pages never load HealthKit
+    records, and the HealthKit types are loaded together the first time any of them is needed.
+    """
 
+    def __init__(self, data_dir=DATA_DIR, version=None):
+        self.data_dir = data_dir
+        # Key for the derived-aggregate caches, so reruns never hash the frames themselves
+        self.version = version or dataset_version(data_dir)
+
+    @cached_property
+    def screen_df(self):
+        # The consolidated store is already deduplicated; legacy CSV extracts are folded in with
+        # `python screentime_store.py merge`. Its timestamps are already UTC, and the frame maps
+        # the store's Arrow snapshot without copying it.
+        screen_df = screentime_store.load_timeline(os.path.join(self.data_dir, "screentime"), SCREEN_COLUMNS)
+
+        # Group screen time usage by local date and hour, using each row's UTC offset
+        local_start_time = screen_df['start_time'].dt.tz_localize(None)
+        if 'tz' in screen_df.columns:
+            local_start_time = local_start_time + pd.to_timedelta(screen_df['tz'].fillna(0), unit='s')
+        screen_df['date'] = local_start_time.dt.date
+        screen_df['hour'] = local_start_time.dt.hour
+        return categorize_apps(screen_df)
+
+    @cached_property
+    def usage_cube(self):
+        # Pre-aggregate usage once; the pages slice this cube instead of rescanning raw events
+        return build_usage_cube(self.screen_df)
+
+    @cached_property
+    def screen_grouped(self):
+        return self.usage_cube.groupby('date').agg({'usage': 'sum'}).reset_index()
+
+    @cached_property
+    def productivity_usage(self):
+        productivity_usage = self.usage_cube[self.usage_cube['parent_category'] == 'Productive'].groupby('date')['usage'].sum().reset_index()
+        productivity_usage['usage_hours'] = productivity_usage['usage'] / 3600
+        return productivity_usage
+
+    @cached_property
+    def health_dfs(self):
+        # Parse health data from the XML file. Parsed records are persisted under
+        # data/healthkit_cache/ so new server processes start warm, and this object is itself
+        # cached per dataset version, so no Streamlit data cache sits in between.
+        healthkit_export_xml = next((os.path.join(self.data_dir, file) for file in os.listdir(self.data_dir) if file.endswith(".xml")), None)
+        # Dates come back as UTC datetime64[ns], so no timezone normalization is needed
+        return healthkit.load_healthkit_types(healthkit_export_xml, HEALTHKIT_TYPES, columns=HEALTHKIT_COLUMNS)
+
+    @cached_property
+    def health_timeline(self):
+        # Sort the samples once so the pages can answer time queries with binary search
+        return HealthTimeline.from_frames(self.health_dfs)
+
+    @cached_property
+    def heart_rate_df(self):
+        return self.health_dfs[HEART_RATE_TYPE]
+
+    @cached_property
+    def session_heart_rate(self):
+        # Heart rate samples recorded during each session; sessions without any are left NaN
+        count, mean, minimum, maximum = self.health_timeline.window_stats(
+            HEART_RATE_TYPE, to_ns(self.screen_df['start_time']), to_ns(self.screen_df['end_time']))
+        return pd.DataFrame({
+            'usage': self.screen_df['usage'].to_numpy(),
+            'value': mean,
+            'min': minimum,
+            'max': maximum,
+            'count': count,
+        })
+
+    @cached_property
+    def sleep_df(self):
+        sleep_df = self.health_dfs['HKCategoryTypeIdentifierSleepAnalysis']
         # Convert 'value' to numeric type
-    sleep_df['value'] = pd.to_numeric(sleep_df['value'], errors='coerce')
-
-    # Map numeric codes to sleep state labels
-    sleep_value_mapping = {
-        0: 'InBed',
-        1: 'AsleepUnspecified',
-        2: 'Awake',
-        3: 'AsleepCore',
-        4: 'AsleepDeep',
-        5: 'AsleepREM'
-    }
-    sleep_df['sleep_state'] = sleep_df['value'].map(sleep_value_mapping)
-
-    # Calculate sleep duration in hours
-    sleep_df['duration'] = (sleep_df['endDate'] - sleep_df['startDate']).dt.total_seconds() / 3600
-
-    # Adjust sleep data to the next day
-    sleep_df['date'] = sleep_df['startDate'].dt.date + pd.Timedelta(days=1)
-    sleep_grouped = sleep_df.groupby('date').agg({'duration': 'sum'}).reset_index()
-
-    # Group screen time usage by date
-    screen_df['date'] = screen_df['start_time'].dt.date
-    screen_df = categorize_apps(screen_df)
-    screen_grouped = screen_df.groupby('date').agg({'usage': 'sum'}).reset_index()
-
-    # Productivity apps list
-    productivity_usage = screen_df[screen_df['parent_category'] == 'Productive'].groupby('date')['usage'].sum().reset_index()
-    productivity_usage['usage_hours'] = productivity_usage['usage'] / 3600
-
-    # Process audio exposure data
-    audio_exposure_df['date'] = audio_exposure_df['startDate'].dt.date
-    audio_grouped = audio_exposure_df.groupby('date').agg({'value': 'mean'}).reset_index()
-    audio_grouped.rename(columns={'value': 'audio_exposure'}, inplace=True)
-
-    return DataFrames(screen_df=screen_df, heart_rate_df=heart_rate_df, sleep_df=sleep_df, audio_exposure_df=audio_exposure_df, sleep_grouped=sleep_grouped, screen_grouped=screen_grouped, productivity_usage=productivity_usage, audio_grouped=audio_grouped)
+        sleep_df['value'] = pd.to_numeric(sleep_df['value'], errors='coerce')
+
+        # Map numeric codes to sleep state labels
+        sleep_value_mapping = {
+            0: 'InBed',
+            1: 'AsleepUnspecified',
+            2: 'Awake',
+            3: 'AsleepCore',
+            4: 'AsleepDeep',
+            5: 'AsleepREM'
+        }
+        sleep_df['sleep_state'] = sleep_df['value'].map(sleep_value_mapping)
+
+        # Calculate sleep duration in hours
+        sleep_df['duration'] = (sleep_df['endDate'] - sleep_df['startDate']).dt.total_seconds() / 3600
+
+        # Attribute each sample to its night, named after the day it ends on
+        sleep_df['date'] = night_of(sleep_df['startDate'])
+        return sleep_df
+
+    @cached_property
+    def sleep_grouped(self):
+        # One row per night with overlapping samples and lower-priority sources resolved
+        return sleep_nights(self.sleep_df)
+
+    @cached_property
+    def audio_exposure_df(self):
+        audio_exposure_df = self.health_dfs['HKQuantityTypeIdentifierHeadphoneAudioExposure']
+        audio_exposure_df['date'] = audio_exposure_df['startDate'].dt.date
+        return audio_exposure_df
+
+    @cached_property
+    def audio_grouped(self):
+        audio_grouped = self.audio_exposure_df.groupby('date').agg({'value': 'mean'}).reset_index()
+        audio_grouped.rename(columns={'value': 'audio_exposure'}, inplace=True)
+        return audio_grouped
+
+@st.cache_resource(max_entries=1)
+def setup_data(version) -> DataFrames:
+    """
+    Setup the data for analysis. Nothing is loaded until a page reads a field.
+    """
+    return DataFrames(DATA_DIR, version)
 
-# Function to parse screentime CSV
-@st.cache_data
-def parse_screentime_csv(csv_file):
+@st.cache_data(max_entries=1)
+def usage_by_hour(version, _usage_cube):
     """
-    Parses the screentime CSV file and returns a DataFrame.
+    Total screen time per hour of the day.
     """
-    screentime_df = pd.read_csv(csv_file)
-    screentime_df['start_time'] = pd.to_datetime(screentime_df['start_time'])
-    screentime_df['end_time'] = pd.to_datetime(screentime_df['end_time'])
-    return screentime_df
+    hourly_usage = _usage_cube.groupby('hour')['usage'].sum().reset_index()
+    hourly_usage['usage_hours'] = hourly_usage['usage'] / 3600
+    return hourly_usage
 
-@st.cache_data
-def parse_healthkit_export(xml_file, data_type):
+@st.cache_data(max_entries=1)
+def heart_rate_by_hour(version, _health_timeline):
     """
-    Parses the HealthKit XML export file and returns a DataFrame of the specified data type.
+    Mean heart rate per local hour of the day.
     """
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-    
-    # Extract records of the specified type
-    health_data = []
-    for record in root.findall("Record"):
-        if record.attrib.get('type') == data_type:
-            health_data.append(record.attrib)
-    
-    # Convert to DataFrame
-    health_df = pd.DataFrame(health_data)
-    
-    # Convert timestamp columns
-    if 'startDate' in health_df.columns:
-        health_df['startDate'] = pd.to_datetime(health_df['startDate'])
-    if 'endDate' in health_df.columns:
-        health_df['endDate'] = pd.to_datetime(health_df['endDate'])
-    # Convert 'value' column to numeric if possible
-    if 'value' in health_df.columns:
-        health_df['value'] = pd.to_numeric(health_df['value'], errors='coerce')
-    return health_df
-
-@st.cache_data
-def peak_usage_times(screen_df):
+    return _health_timeline.hour_of_day_mean(HEART_RATE_TYPE)
+
+def peak_usage_times(data):
     """
     Gets the largest usage times of the day.
     """
     st.title('Peak Usage Times')
 
     # Peak usage times
-    screen_df['hour'] = screen_df['start_time'].dt.hour
-    peak_usage_times = screen_df.groupby('hour')['usage'].sum().reset_index()
-
-    # Convert usage to hours for better readability
-    peak_usage_times['usage_hours'] = peak_usage_times['usage'] / 3600
+    peak_usage_times = usage_by_hour(data.version, data.usage_cube)
 
     # Plot peak usage times
     fig, ax = plt.subplots(figsize=(10, 6))
@@ -162,23 +206,62 @@ def peak_usage_times(screen_df):
 
     st.pyplot(fig)
 
-@st.cache_data
-def screen_time_analysis(screen_df):
+@st.cache_data(max_entries=1)
+def screen_time_aggregates(version, _usage_cube, _screen_df):
     """
-    Analyzes the screen time data.
+    Aggregates behind the Screen Time Analysis page.
     """
-    st.title('Screen Time Data Analysis')
-
-    # Display Screen Time DataFrame
-    st.subheader('Screen Time Data')
+    usage_cube = _usage_cube
 
      # Group by date and category
-    category_usage = screen_df.groupby(['date', 'parent_category'])['usage'].sum().reset_index()
+    category_usage = usage_cube.groupby(['date', 'parent_category'], observed=True)['usage'].sum().reset_index()
     category_usage['usage_hours'] = category_usage['usage'] / 3600
 
     # Pivot the DataFrame for easier plotting
     category_pivot = category_usage.pivot(index='date', columns='parent_category', values='usage_hours').fillna(0)
 
+    total_usage_per_app = usage_cube.groupby('app', observed=True)['usage'].sum().reset_index()
+    total_usage_per_app = total_usage_per_app.sort_values(by='usage', ascending=False)
+
+    # Limit to top 10 apps by usage
+    top_apps = total_usage_per_app.head(4)['app'].tolist()
+    usage_cube_top = usage_cube[usage_cube['app'].isin(top_apps)]
+
+    # Aggregate usage by day for better readability
+    daily_usage = usage_cube_top.groupby(['date', 'app'], observed=True)['usage'].sum().unstack().fillna(0)
+
+    # Group by hour and category
+    hourly_usage = usage_cube.groupby(['hour', 'parent_category'], observed=True)['usage'].sum().reset_index()
+    hourly_usage['usage_hours'] = hourly_usage['usage'] / 3600
+
+    # Pivot for heatmap
+    heatmap_data = hourly_usage.pivot(index='hour', columns='parent_category', values='usage_hours').fillna(0)
+
+    return {
+        'category_pivot': category_pivot,
+        'total_usage_per_app': total_usage_per_app,
+        'daily_usage': daily_usage,
+        'heatmap_data': heatmap_data,
+        # Per session, not per cube cell
+        'statistics': _screen_df[['usage']].describe(),
+        'total_usage': usage_cube['usage'].sum(),
+        'average_session_length': usage_cube['usage'].sum() / usage_cube['sessions'].sum(),
+    }
+
+def screen_time_analysis(data):
+    """
+    Analyzes the screen time data.
+    """
+    aggregates = screen_time_aggregates(data.version, data.usage_cube, data.screen_df)
+    category_pivot = aggregates['category_pivot']
+    total_usage_per_app = aggregates['total_usage_per_app']
+    heatmap_data = aggregates['heatmap_data']
+
+    st.title('Screen Time Data Analysis')
+
+    # Display Screen Time DataFrame
+    st.subheader('Screen Time Data')
+
     # Plot stacked bar chart
     fig, ax = plt.subplots(figsize=(12, 6))
     category_pivot.plot(kind='bar', stacked=True, ax=ax)
@@ -188,21 +271,9 @@ def screen_time_analysis(screen_df):
     plt.xticks(rotation=45)
     st.pyplot(fig)
 
-    
-    total_usage_per_app = screen_df.groupby('app')['usage'].sum().reset_index()
-    total_usage_per_app = total_usage_per_app.sort_values(by='usage', ascending=False)
-
-    # Limit to top 10 apps by usage
-    top_apps = total_usage_per_app.head(4)['app'].tolist()
-    screen_df_top = screen_df[screen_df['app'].isin(top_apps)]
-
-    # Aggregate usage by day for better readability
-    screen_df_top['date'] = screen_df_top['start_time'].dt.date
-    daily_usage = screen_df_top.groupby(['date', 'app'])['usage'].sum().unstack().fillna(0)
-
     # Plot total usage per app
     fig1, ax1 = plt.subplots(figsize=(10, 6))
-    daily_usage.plot(ax=ax1)
+    aggregates['daily_usage'].plot(ax=ax1)
     ax1.set_xlabel('Date')
     ax1.set_ylabel('Total Usage (seconds)')
     ax1.set_title('Total Usage per App')
@@ -211,9 +282,7 @@ def screen_time_analysis(screen_df):
     st.pyplot(fig1)
 
     # Peak usage times
-    screen_df['hour'] = screen_df['start_time'].dt.hour
-    peak_usage_times = screen_df.groupby('hour')['usage'].sum().reset_index()
-    peak_usage_times['usage_hours'] = peak_usage_times['usage'] / 3600
+    peak_usage_times = usage_by_hour(data.version, data.usage_cube)
 
     # Plot peak usage times
     fig2, ax2 = plt.subplots(figsize=(10, 6))
@@ -226,13 +295,6 @@ def screen_time_analysis(screen_df):
 
     st.title('Usage Patterns Over Time')
 
-    # Group by hour and category
-    hourly_usage = screen_df.groupby(['hour', 'parent_category'])['usage'].sum().reset_index()
-    hourly_usage['usage_hours'] = hourly_usage['usage'] / 3600
-
-    # Pivot for heatmap
-    heatmap_data = hourly_usage.pivot(index='hour', columns='parent_category', values='usage_hours').fillna(0)
-
     # Plot heatmap
     fig, ax = plt.subplots(figsize=(12, 8))
     sns.heatmap(heatmap_data, annot=True, fmt=".1f", cmap='YlGnBu', ax=ax)
@@ -245,7 +307,7 @@ def screen_time_analysis(screen_df):
 
         # Basic Statistics
         st.subheader('Basic Statistics')
-        st.write(screen_df.describe())
+        st.write(aggregates['statistics'])
 
         st.subheader('Daily Usage by Category')
         st.write(category_pivot)
@@ -261,28 +323,24 @@ def screen_time_analysis(screen_df):
     # Summary
     st.subheader('Summary of Analysis')
     summary = {
-        'total_usage': screen_df['usage'].sum(),
-        'average_session_length': screen_df['usage'].mean(),
+        'total_usage': aggregates['total_usage'],
+        'average_session_length': aggregates['average_session_length'],
         'most_used_app': total_usage_per_app.iloc[0]['app'],
         'peak_usage_hour': peak_usage_times['hour'][peak_usage_times['usage'].idxmax()]
     }
     st.write(summary)
 
-@st.cache_data
-def peak_usage_and_heart_rate(screen_df, heart_rate_df):
+def peak_usage_and_heart_rate(data):
     """
     Compares heart rate and screen time usage.
     """
     st.title('Peak Usage Times and Heart Rate')
 
     # Aggregate screen time usage by hour
-    screen_df['hour'] = screen_df['start_time'].dt.hour
-    hourly_screen_usage = screen_df.groupby('hour')['usage'].sum().reset_index()
-    hourly_screen_usage['usage_hours'] = hourly_screen_usage['usage'] / 3600
+    hourly_screen_usage = usage_by_hour(data.version, data.usage_cube)
 
     # Aggregate heart rate by hour
-    heart_rate_df['hour'] = heart_rate_df['startDate'].dt.hour
-    hourly_heart_rate = heart_rate_df.groupby('hour')['value'].mean().reset_index()
+    hourly_heart_rate = heart_rate_by_hour(data.version, data.health_timeline)
 
     # Plot screen time and heart rate
     fig, ax1 = plt.subplots(figsize=(10, 6))
@@ -304,59 +362,75 @@ def peak_usage_and_heart_rate(screen_df, heart_rate_df):
     ax1.grid(True)
     st.pyplot(fig)
 
-@st.cache_data
-def heart_rate_analysis(heart_rate_df, screen_df):
+@st.cache_data(max_entries=1)
+def heart_rate_aggregates(version, _heart_rate_df, _session_heart_rate):
+    """
+    Aggregates behind the Heart Rate Analysis page. Only a bounded sample of the sessions is
+    kept for the scatter plot, so cache hits don't scale with the number of sessions.
+    """
+    sessions = _session_heart_rate.dropna(subset=['value'])
+    return {
+        'statistics': _heart_rate_df.describe(),
+        'scatter_sample': sessions.sample(min(len(sessions), SCATTER_SAMPLE_SIZE), random_state=0),
+        'correlation': _session_heart_rate[['usage', 'value']].corr(),
+    }
+
+def heart_rate_analysis(data):
+    aggregates = heart_rate_aggregates(data.version, data.heart_rate_df, data.session_heart_rate)
+    merged_df = aggregates['scatter_sample']
+
     st.title('Heart Rate Data Analysis')
 
     # Display Heart Rate DataFrame
     st.subheader('Heart Rate Data')
-    st.write(heart_rate_df)
+    st.write(data.heart_rate_df)
 
     # Basic Statistics
     st.subheader('Basic Statistics')
-    st.write(heart_rate_df.describe())
+    st.write(aggregates['statistics'])
 
     # Correlate screen time with heart rate data
     st.subheader('Correlation Analysis with Heart Rate')
-    merged_df = pd.merge_asof(screen_df.sort_values('start_time'), heart_rate_df.sort_values('startDate'), left_on='start_time', right_on='startDate')
-    correlation = merged_df[['usage', 'value']].corr()
-    st.write(correlation)
+    st.write(aggregates['correlation'])
 
     # Plot peak usage times and heart rate
-    peak_usage_and_heart_rate(screen_df, heart_rate_df)
+    peak_usage_and_heart_rate(data)
 
     # Plot heart rate vs screen time usage
     fig4, ax4 = plt.subplots(figsize=(10, 6))
     ax4.scatter(merged_df['value'], merged_df['usage'])
-    ax4.set_xlabel('Heart Rate (count/min)')
+    ax4.set_xlabel('Mean Heart Rate During Session (count/min)')
     ax4.set_ylabel('Screen Time Usage (seconds)')
     ax4.set_title('Heart Rate vs Screen Time Usage')
     st.pyplot(fig4)
 
 
-@st.cache_data
-def sleep_analysis(sleep_df, screen_df, heart_rate_df, screen_grouped):
+@st.cache_data(max_entries=1)
+def sleep_aggregates(version, _sleep_grouped, _screen_grouped):
+    """
+    Aggregates behind the Sleep Analysis page.
+    """
+    merged_sleep_df = pd.merge(_screen_grouped, _sleep_grouped, on='date', how='inner')
+    return {
+        'merged_sleep_df': merged_sleep_df,
+        'correlation_sleep': merged_sleep_df[['usage', 'duration']].corr(),
+    }
+
+def sleep_analysis(data):
     """
     Analyze sleep data in relation to screen time and heart rate, including daily sleep patterns,
     correlations with screen time, and hourly patterns.
     """
-    # Calculate sleep duration in hours
-    sleep_df['duration'] = (sleep_df['endDate'] - sleep_df['startDate']).dt.total_seconds() / 3600
-
-    # Adjust sleep data to the next day to better align with daily cycles
-    sleep_df['date'] = sleep_df['startDate'].dt.date + pd.Timedelta(days=1)
-
-    # Group sleep data by date
-    sleep_grouped = sleep_df.groupby('date').agg({'duration': 'sum'}).reset_index()
+    # Nights are already attributed to the day they end on in `DataFrames.sleep_grouped`
+    sleep_grouped = data.sleep_grouped
+    aggregates = sleep_aggregates(data.version, sleep_grouped, data.screen_grouped)
+    merged_sleep_df = aggregates['merged_sleep_df']
 
     # Group screen time usage by hour
-    screen_df['hour'] = screen_df['start_time'].dt.hour
-    hourly_screen_usage = screen_df.groupby('hour')['usage'].sum().reset_index()
-    hourly_screen_usage['usage_hours'] = hourly_screen_usage['usage'] / 3600
+    hourly_screen_usage = usage_by_hour(data.version, data.usage_cube)
 
     # Group heart rate data by hour
-    heart_rate_df['hour'] = heart_rate_df['startDate'].dt.hour
-    hourly_heart_rate = heart_rate_df.groupby('hour')['value'].mean().reset_index()
+    hourly_heart_rate = heart_rate_by_hour(data.version, data.health_timeline)
 
     # Display comprehensive analysis
     st.title('Comprehensive Sleep Data Analysis')
@@ -374,9 +448,7 @@ def sleep_analysis(sleep_df, screen_df, heart_rate_df, screen_grouped):
 
     # Correlation analysis with screen time
     st.subheader('Correlation Analysis with Screen Time')
-    merged_sleep_df = pd.merge(screen_grouped, sleep_grouped, on='date', how='inner')
-    correlation_sleep = merged_sleep_df[['usage', 'duration']].corr()
-    st.write(correlation_sleep)
+    st.write(aggregates['correlation_sleep'])
 
     # Scatter plot for sleep vs. screen time usage
     st.subheader('Sleep Duration vs Screen Time Usage')
@@ -391,9 +463,6 @@ def sleep_analysis(sleep_df, screen_df, heart_rate_df, screen_grouped):
     # Heatmap: Hourly sleep vs. screen time
     st.subheader('Hourly Sleep vs. Screen Time Heatmap')
 
-    # Ensure 'usage_hours' column is numeric and fill missing values
-    hourly_screen_usage['usage_hours'] = pd.to_numeric(hourly_screen_usage['usage_hours'], errors='coerce').fillna(0)
-
     # Create the pivot table for the heatmap
     heatmap_data = hourly_screen_usage.pivot_table(values='usage_hours', index='hour', aggfunc='sum')
 
@@ -429,17 +498,45 @@ def sleep_analysis(sleep_df, screen_df, heart_rate_df, screen_grouped):
 
     # Display Sleep DataFrame
     st.subheader('Sleep Data')
-    st.write(sleep_df)
+    st.write(data.sleep_df)
+
+
+@st.cache_data(max_entries=1)
+def additional_insights_aggregates(version, _usage_cube, _audio_exposure_df):
+    """
+    Aggregates behind the Additional Insights page.
+    """
+    usage_cube = _usage_cube
+
+    # Daily Screen Time Patterns
+    daily_screen_usage = usage_cube.groupby('date')['usage'].sum().reset_index()
+    daily_screen_usage['usage_hours'] = daily_screen_usage['usage'] / 3600
+
+    # Productivity vs. Music Loudness
+    productivity_apps = ['com.microsoft.VSCode', 'com.apple.dt.Xcode', 'company.thebrowser.Browser', 'com.openai.chat']
+
+    productivity_usage = usage_cube[usage_cube['app'].isin(productivity_apps)].groupby('date')['usage'].sum().reset_index()
+    productivity_usage['usage_hours'] = productivity_usage['usage'] / 3600
 
+    daily_audio_exposure = _audio_exposure_df.groupby('date')['value'].mean().reset_index()
+
+    # Merge DataFrames
+    merged_productivity_audio = pd.merge(productivity_usage, daily_audio_exposure, on='date', how='inner')
+    return {
+        'daily_screen_usage': daily_screen_usage,
+        'merged_productivity_audio': merged_productivity_audio,
+        'correlation_audio': merged_productivity_audio[['usage_hours', 'value']].corr(),
+    }
+
+def additional_insights(data):
+    aggregates = additional_insights_aggregates(data.version, data.usage_cube, data.audio_exposure_df)
+    daily_screen_usage = aggregates['daily_screen_usage']
+    merged_productivity_audio = aggregates['merged_productivity_audio']
 
-@st.cache_data
-def additional_insights(screen_df, audio_exposure_df):
     st.title('Additional Insights')
 
     # Daily Screen Time Patterns
     st.subheader('Daily Screen Time Patterns')
-    daily_screen_usage = screen_df.groupby('date')['usage'].sum().reset_index()
-    daily_screen_usage['usage_hours'] = daily_screen_usage['usage'] / 3600
 
     fig1, ax1 = plt.subplots(figsize=(10, 6))
     ax1.plot(daily_screen_usage['date'], daily_screen_usage['usage_hours'], marker='o')
@@ -452,20 +549,7 @@ def additional_insights(screen_df, audio_exposure_df):
 
     # Productivity vs. Music Loudness
     st.subheader('Productivity vs. Music Loudness')
-    productivity_apps = ['com.microsoft.VSCode', 'com.apple.dt.Xcode', 'company.thebrowser.Browser', 'com.openai.chat']
-
-    screen_df['parent_category'] = screen_df['app'].apply(lambda x: 'Productive' if x in productivity_apps else 'Other')
-    productivity_usage = screen_df[screen_df['parent_category'] == 'Productive'].groupby('date')['usage'].sum().reset_index()
-    productivity_usage['usage_hours'] = productivity_usage['usage'] / 3600
-
-    audio_exposure_df['date'] = audio_exposure_df['startDate'].dt.date
-    daily_audio_exposure = audio_exposure_df.groupby('date')['value'].mean().reset_index()
-
-    # Merge DataFrames
-    merged_productivity_audio = pd.merge(productivity_usage, daily_audio_exposure, on='date', how='inner')
-    correlation_audio = merged_productivity_audio[['usage_hours', 'value']].corr()
-
-    st.write(correlation_audio)
+    st.write(aggregates['correlation_audio'])
 
     fig2, ax2 = plt.subplots(figsize=(10, 6))
     ax2.scatter(merged_productivity_audio['value'], merged_productivity_audio['usage_hours'])
@@ -474,14 +558,15 @@ def additional_insights(screen_df, audio_exposure_df):
     ax2.set_title('Productivity App Usage vs. Average Audio Exposure')
     st.pyplot(fig2)
 
-@st.cache_data
-def productivity_analysis(sleep_grouped, productivity_usage, audio_grouped):
-    st.title('Productivity Analysis')
-
+@st.cache_data(max_entries=1)
+def productivity_analysis_aggregates(version, _sleep_grouped, _productivity_usage, _audio_grouped):
+    """
+    Aggregates behind the Productivity Analysis page.
+    """
     # Ensure 'date' columns are datetime
-    sleep_grouped['date'] = pd.to_datetime(sleep_grouped['date'])
-    productivity_usage['date'] = pd.to_datetime(productivity_usage['date'])
-    audio_grouped['date'] = pd.to_datetime(audio_grouped['date'])
+    sleep_grouped = _sleep_grouped.assign(date=pd.to_datetime(_sleep_grouped['date']))
+    productivity_usage = _productivity_usage.assign(date=pd.to_datetime(_productivity_usage['date']))
+    audio_grouped = _audio_grouped.assign(date=pd.to_datetime(_audio_grouped['date']))
 
     # Create sleep_grouped_next_day by shifting the 'date' back by one day
     sleep_grouped_next_day = sleep_grouped.copy()
@@ -496,6 +581,23 @@ def productivity_analysis(sleep_grouped, productivity_usage, audio_grouped):
     merged_df_same_day.rename(columns={'duration': 'same_day_sleep_duration'}, inplace=True)
     merged_df_next_day.rename(columns={'duration': 'next_day_sleep_duration'}, inplace=True)
 
+    return {
+        'merged_df_same_day': merged_df_same_day,
+        'merged_df_next_day': merged_df_next_day,
+        'merged_df_audio': merged_df_audio,
+        'correlation_same_day': merged_df_same_day[['usage_hours', 'same_day_sleep_duration']].corr(),
+        'correlation_next_day': merged_df_next_day[['usage_hours', 'next_day_sleep_duration']].corr(),
+        'correlation_audio': merged_df_audio[['usage_hours', 'audio_exposure']].corr(),
+    }
+
+def productivity_analysis(data):
+    aggregates = productivity_analysis_aggregates(data.version, data.sleep_grouped, data.productivity_usage, data.audio_grouped)
+    merged_df_same_day = aggregates['merged_df_same_day']
+    merged_df_next_day = aggregates['merged_df_next_day']
+    merged_df_audio = aggregates['merged_df_audio']
+
+    st.title('Productivity Analysis')
+
     st.subheader('Productivity vs. Same Day Sleep Duration')
     fig1, ax1 = plt.subplots(figsize=(10, 6))
     ax1.scatter(merged_df_same_day['same_day_sleep_duration'], merged_df_same_day['usage_hours'])
@@ -521,31 +623,30 @@ def productivity_analysis(sleep_grouped, productivity_usage, audio_grouped):
     st.pyplot(fig3)
 
     st.subheader('Correlation Analysis')
-    correlation_same_day = merged_df_same_day[['usage_hours', 'same_day_sleep_duration']].corr()
-    correlation_next_day = merged_df_next_day[['usage_hours', 'next_day_sleep_duration']].corr()
-    correlation_audio = merged_df_audio[['usage_hours', 'audio_exposure']].corr()
-
     st.write("Correlation with Same Day Sleep Duration")
-    st.write(correlation_same_day)
+    st.write(aggregates['correlation_same_day'])
     st.write("Correlation with Next Day Sleep Duration")
-    st.write(correlation_next_day)
+    st.write(aggregates['correlation_next_day'])
     st.write("Correlation with Audio Exposure")
-    st.write(correlation_audio)
+    st.write(aggregates['correlation_audio'])
 
     # Insights summary
     st.subheader('Insights Summary')
     st.write('This analysis provides insights into how your productivity is influenced by sleep duration and audio exposure. Key correlations and trends are highlighted.')
 
-@st.cache_data
-def productivity_metrics(screen_df):
-    st.title('Productivity Metrics')
+@st.cache_data(max_entries=1)
+def productivity_metrics_aggregates(version, _usage_cube):
+    """
+    Aggregates behind the Productivity Metrics page.
+    """
+    usage_cube = _usage_cube
 
     # Total usage per day
-    total_daily_usage = screen_df.groupby('date')['usage'].sum().reset_index()
+    total_daily_usage = usage_cube.groupby('date')['usage'].sum().reset_index()
     total_daily_usage['usage_hours'] = total_daily_usage['usage'] / 3600
 
     # Productive usage per day
-    productive_daily_usage = screen_df[screen_df['parent_category'] == 'Productive'].groupby('date')['usage'].sum().reset_index()
+    productive_daily_usage = usage_cube[usage_cube['parent_category'] == 'Productive'].groupby('date')['usage'].sum().reset_index()
     productive_daily_usage['usage_hours'] = productive_daily_usage['usage'] / 3600
 
     # Merge DataFrames
@@ -554,34 +655,30 @@ def productivity_metrics(screen_df):
     # Calculate productivity ratio
     daily_productivity['productivity_ratio'] = (daily_productivity['usage_hours_productive'] / daily_productivity['usage_hours_total']) * 100
 
+    # Calculate 7-day rolling average for productivity ratio
+    daily_productivity['rolling_productivity_ratio'] = daily_productivity['productivity_ratio'].rolling(window=7, min_periods=1).mean()
+
+    # Analyze productivity by day of the week
+    daily_productivity['day_of_week'] = pd.to_datetime(daily_productivity['date']).dt.day_name()
+    productivity_by_day = daily_productivity.groupby('day_of_week')['productivity_ratio'].mean().reindex([
+        'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+
+    return {
+        'daily_productivity': daily_productivity,
+        'productivity_by_day': productivity_by_day,
+        'head': usage_cube.head(),
+    }
+
+def productivity_metrics(data):
+    aggregates = productivity_metrics_aggregates(data.version, data.usage_cube)
+    daily_productivity = aggregates['daily_productivity']
+    productivity_by_day = aggregates['productivity_by_day']
+
+    st.title('Productivity Metrics')
+
     # Calculate averages
     avg_productive_hours = daily_productivity['usage_hours_productive'].mean()
     avg_productivity_ratio = daily_productivity['productivity_ratio'].mean()
-    
-    # Ensure daily_productivity DataFrame exists
-    if 'daily_productivity' not in locals():
-        # Total usage per day
-        total_daily_usage = screen_df.groupby('date')['usage'].sum().reset_index()
-        total_daily_usage['usage_hours'] = total_daily_usage['usage'] / 3600
-
-        # Productive usage per day
-        productive_daily_usage = screen_df[screen_df['parent_category'] == 'Productive'].groupby('date')['usage'].sum().reset_index()
-        productive_daily_usage['usage_hours'] = productive_daily_usage['usage'] / 3600
-
-        # Merge DataFrames
-        daily_productivity = pd.merge(
-            total_daily_usage[['date', 'usage_hours']],
-            productive_daily_usage[['date', 'usage_hours']],
-            on='date',
-            how='left',
-            suffixes=('_total', '_productive')
-        ).fillna(0)
-
-        # Calculate productivity ratio
-        daily_productivity['productivity_ratio'] = (daily_productivity['usage_hours_productive'] / daily_productivity['usage_hours_total']) * 100
-
-    # Calculate 7-day rolling average for productivity ratio
-    daily_productivity['rolling_productivity_ratio'] = daily_productivity['productivity_ratio'].rolling(window=7, min_periods=1).mean()
 
     # Plot productivity ratio over time
     fig, ax = plt.subplots(figsize=(12, 6))
@@ -594,11 +691,6 @@ def productivity_metrics(screen_df):
     ax.legend()
     st.pyplot(fig)
 
-    # Analyze productivity by day of the week
-    daily_productivity['day_of_week'] = pd.to_datetime(daily_productivity['date']).dt.day_name()
-    productivity_by_day = daily_productivity.groupby('day_of_week')['productivity_ratio'].mean().reindex([
-        'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
-
     # Plot productivity by day of the week
     fig2, ax2 = plt.subplots(figsize=(10, 6))
     ax2.bar(productivity_by_day.index, productivity_by_day.values)
@@ -612,41 +704,45 @@ def productivity_metrics(screen_df):
     st.subheader('Daily Productivity Metrics')
     st.write(daily_productivity)
     
-    st.write(screen_df.head())
+    st.write(aggregates['head'])
 
     st.subheader('Average Productivity')
     st.write(f"Average Daily Productive Hours: {avg_productive_hours:.2f} hours")
     st.write(f"Average Productivity Ratio: {avg_productivity_ratio:.2f}%")
 
-sidebar = st.sidebar
-sidebar.title("HealthKit and Screen Time Data Analyzer")
-sidebar.subheader("Understand your digital habits and health data.")
+def main():
+    sidebar = st.sidebar
+    sidebar.title("HealthKit and Screen Time Data Analyzer")
+    sidebar.subheader("Understand your digital habits and health data.")
 
 
-data = setup_data()
+    data = setup_data(dataset_version())
 
-page = sidebar.radio("Go to", ["Screen Time Analysis", "Sleep Analysis", "Productivity Metrics", "Productivity Analysis", "Heart Rate Analysis", "Additional Insights"])
+    page = sidebar.radio("Go to", ["Screen Time Analysis", "Sleep Analysis", "Productivity Metrics", "Productivity Analysis", "Heart Rate Analysis", "Additional Insights"])
 
-sidebar.markdown("""
+    sidebar.markdown("""
 ---
 Created by **Andreas Ink**
 """)
 
-sidebar.markdown("""  
+    sidebar.markdown("""  
 [Github](https://github.com/AndreasInk)
 [LinkedIn](https://www.linkedin.com/in/andreas-ink/)              
 """)
 
-if page == "Screen Time Analysis":
-    screen_time_analysis(data.screen_df)
-elif page == "Heart Rate Analysis":
-    heart_rate_analysis(data.heart_rate_df, data.screen_df)
-elif page == "Sleep Analysis":
-    sleep_analysis(data.sleep_df, data.screen_df, data.heart_rate_df, data.screen_grouped)
-elif page == "Productivity Analysis":
-    productivity_analysis(data.sleep_grouped, data.productivity_usage, data.audio_grouped)
-elif page == "Productivity Metrics":
-    productivity_metrics(data.screen_df)
-elif page == "Additional Insights":
-    additional_insights(data.screen_df, data.audio_exposure_df)
-
+    if page == "Screen Time Analysis":
+        screen_time_analysis(data)
+    elif page == "Heart Rate Analysis":
+        heart_rate_analysis(data)
+    elif page == "Sleep Analysis":
+        sleep_analysis(data)
+    elif page == "Productivity Analysis":
+        productivity_analysis(data)
+    elif page == "Productivity Metrics":
+        productivity_metrics(data)
+    elif page == "Additional Insights":
+        additional_insights(data)
+
+
+if __name__ == "__main__":
+    main()
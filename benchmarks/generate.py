@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from categories import RULES_FILE
+
+TIMEZONE = "America/Los_Angeles"
+START_DATE = "2015-01-01"
+DAY_SECONDS = 86400
+
+EXPORT_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE HealthData [
+<!ELEMENT HealthData (ExportDate,Me,(Record|Correlation|Workout|ActivitySummary)*)>
+<!ATTLIST HealthData locale CDATA #REQUIRED>
+<!ELEMENT Record ((MetadataEntry|HeartRateVariabilityMetadataList)*)>
+<!ATTLIST Record type CDATA #REQUIRED unit CDATA #IMPLIED value CDATA #IMPLIED sourceName CDATA #REQUIRED sourceVersion CDATA #IMPLIED device CDATA #IMPLIED creationDate CDATA #IMPLIED startDate CDATA #REQUIRED endDate CDATA #REQUIRED>
+]>
+<HealthData locale="en_US">
+ <ExportDate value="{export_date}"/>
+ <Me HKCharacteristicTypeIdentifierDateOfBirth="1990-01-01" HKCharacteristicTypeIdentifierBiologicalSex="HKBiologicalSexNotSet" HKCharacteristicTypeIdentifierBloodType="HKBloodTypeNotSet" HKCharacteristicTypeIdentifierFitzpatrickSkinType="HKFitzpatrickSkinTypeNotSet" HKCharacteristicTypeIdentifierCardioFitnessMedicationsUse="None"/>
+"""
+WATCH = 'sourceName="Apple Watch" sourceVersion="10.1" device="&lt;&lt;HKDevice: 0x600000000000&gt;, name:Apple Watch, manufacturer:Apple Inc., model:Watch, hardware:Watch7,1, software:10.1&gt;"'
+PHONE = 'sourceName="iPhone" sourceVersion="17.1"'
+SLEEP_STAGES = [
+    'HKCategoryValueSleepAnalysisAsleepCore',
+    'HKCategoryValueSleepAnalysisAsleepDeep',
+    'HKCategoryValueSleepAnalysisAsleepREM',
+    'HKCategoryValueSleepAnalysisAwake',
+]
+# Made-up bundle IDs that no category rule matches
+UNKNOWN_APPS = [f"com.example.app{index}" for index in range(40)]
+
+
+def _days(months):
+    return pd.date_range(START_DATE, periods=int(round(months * 30.44)), freq="D", tz=TIMEZONE)
+
+
+def _export_dates(day, seconds):
+    """
+    Formats seconds after local midnight as export date strings with the day's UTC offset.
+    """
+    offset_minutes = int(day.utcoffset().total_seconds() // 60)
+    sign = '-' if offset_minutes < 0 else '+'
+    suffix = f" {sign}{abs(offset_minutes) // 60:02d}{abs(offset_minutes) % 60:02d}"
+    local = np.datetime64(day.strftime('%Y-%m-%d'), 's') + np.asarray(seconds, dtype='int64').astype('timedelta64[s]')
+    return np.char.add(np.char.replace(np.datetime_as_string(local, unit='s'), 'T', ' '), suffix)
+
+
+def generate_export(path, months, heart_rate_interval=5, seed=0):
+    """
+    Writes a synthetic HealthKit export.xml covering `months` months and returns the record
+    counts per type.
+
+    Heart rate is sampled every `heart_rate_interval` seconds around the clock, each night has
+    an in-bed record plus ~90-minute sleep-stage cycles, and headphone audio exposure is
+    logged in half-hour blocks during the day. The same arguments always produce the same file.
+    """
+    rng = np.random.default_rng(seed)
+    days = _days(months)
+    counts = {'HKQuantityTypeIdentifierHeartRate': 0, 'HKCategoryTypeIdentifierSleepAnalysis': 0,
+              'HKQuantityTypeIdentifierHeadphoneAudioExposure': 0}
+    with open(path, 'w') as f:
+        f.write(EXPORT_HEADER.format(export_date=_export_dates(days[-1], [DAY_SECONDS - 1])[0]))
+        for day in days:
+            # Heart rate: a daily rhythm plus noise, with a motion-context metadata child
+            seconds = np.arange(0, DAY_SECONDS, heart_rate_interval)
+            bpm = 62 + 12 * np.sin((seconds / DAY_SECONDS - 0.3) * 2 * np.pi) + rng.normal(0, 4, len(seconds))
+            dates = _export_dates(day, seconds)
+            f.writelines(
+                f' <Record type="HKQuantityTypeIdentifierHeartRate" {WATCH} unit="count/min" creationDate="{date}" startDate="{date}" endDate="{date}" value="{value:.0f}">\n'
+                '  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="0"/>\n'
+                ' </Record>\n'
+                for date, value in zip(dates, bpm)
+            )
+            counts['HKQuantityTypeIdentifierHeartRate'] += len(seconds)
+
+            # Sleep: in bed from about 23:00 (of the previous evening) for 7-9 hours
+            bed = -3600 + int(rng.integers(-1800, 1800))
+            wake = bed + int(rng.integers(7 * 3600, 9 * 3600))
+            stage_starts = np.arange(bed, wake, 30 * 60)
+            stages = rng.choice(SLEEP_STAGES, len(stage_starts), p=[0.5, 0.2, 0.22, 0.08])
+            starts = _export_dates(day, np.r_[bed, stage_starts])
+            ends = _export_dates(day, np.r_[wake, np.minimum(stage_starts + 30 * 60, wake)])
+            values = np.r_[['HKCategoryValueSleepAnalysisInBed'], stages]
+            f.writelines(
+                f' <Record type="HKCategoryTypeIdentifierSleepAnalysis" {WATCH} creationDate="{end}" startDate="{start}" endDate="{end}" value="{value}"/>\n'
+                for start, end, value in zip(starts, ends, values)
+            )
+            counts['HKCategoryTypeIdentifierSleepAnalysis'] += len(values)
+
+            # Headphone audio exposure: a few half-hour listening blocks between 08:00 and 22:00
+            blocks = np.sort(rng.choice(np.arange(16, 44), int(rng.integers(2, 8)), replace=False)) * 1800
+            starts, ends = _export_dates(day, blocks), _export_dates(day, blocks + 1800)
+            levels = rng.normal(68, 6, len(blocks))
+            f.writelines(
+                f' <Record type="HKQuantityTypeIdentifierHeadphoneAudioExposure" {PHONE} unit="dBASPL" creationDate="{end}" startDate="{start}" endDate="{end}" value="{level:.1f}"/>\n'
+                for start, end, level in zip(starts, ends, levels)
+            )
+            counts['HKQuantityTypeIdentifierHeadphoneAudioExposure'] += len(blocks)
+        f.write('</HealthData>\n')
+    return counts
+
+
+def generate_screentime_csv(path, months, sessions_per_day=150, seed=0):
+    """
+    Writes a synthetic Screen Time extract in the legacy CSV layout (local wall-clock times
+    plus each row's UTC offset in seconds) and returns its row count.
+
+    Apps are drawn from the bundle IDs in category_rules.json plus unmatched ones, with a
+    Zipf-like popularity so a few apps dominate like in real data.
+    """
+    rng = np.random.default_rng(seed)
+    with open(RULES_FILE) as f:
+        apps = np.array(sorted(json.load(f)['exact']) + UNKNOWN_APPS)
+    popularity = 1 / np.arange(1, len(apps) + 1) ** 1.1
+    popularity = rng.permutation(popularity / popularity.sum())
+
+    frames = []
+    for day in _days(months):
+        n = int(rng.poisson(sessions_per_day))
+        # Sessions cluster in waking hours
+        start = np.sort(rng.integers(7 * 3600, DAY_SECONDS, n))
+        usage = np.maximum(rng.lognormal(4.5, 1.2, n).astype(np.int64), 1)
+        local_day = np.datetime64(day.strftime('%Y-%m-%d'), 's')
+        start_time = local_day + start.astype('timedelta64[s]')
+        frames.append(pd.DataFrame({
+            'app': rng.choice(apps, n, p=popularity),
+            'usage': usage.astype(float),
+            'start_time': start_time,
+            'end_time': start_time + usage.astype('timedelta64[s]'),
+            'created_at': start_time + usage.astype('timedelta64[s]'),
+            'tz': int(day.utcoffset().total_seconds()),
+            'device_id': None,
+            'device_model': None,
+        }))
+    df = pd.concat(frames, ignore_index=True)
+    df.to_csv(path, index=False, date_format='%Y-%m-%d %H:%M:%S')
+    return len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic HealthKit and Screen Time data.")
+    parser.add_argument("--months", type=float, default=1, help="Months of data to generate (default: %(default)s)")
+    parser.add_argument("--out", default="./benchmarks/data", help="Output data directory (default: %(default)s)")
+    parser.add_argument("--heart-rate-interval", type=int, default=5, help="Seconds between heart rate samples (default: %(default)s)")
+    parser.add_argument("--sessions-per-day", type=int, default=150, help="Average Screen Time sessions per day (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    counts = generate_export(os.path.join(args.out, "export.xml"), args.months, args.heart_rate_interval, args.seed)
+    rows = generate_screentime_csv(os.path.join(args.out, "screentime_data_synthetic.csv"), args.months, args.sessions_per_day, args.seed)
+    print(json.dumps({'healthkit_records': counts, 'screentime_rows': rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from generate import generate_export, generate_screentime_csv
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def _parse_healthkit_export(data_dir):
+    import healthkit
+    start = time.perf_counter()
+    healthkit.parse_healthkit_export(os.path.join(data_dir, "export.xml"), 'HKQuantityTypeIdentifierHeartRate')
+    return time.perf_counter() - start
+
+
+def _parse_healthkit_types(data_dir):
+    import app
+    import healthkit
+    start = time.perf_counter()
+    healthkit.parse_healthkit_types(os.path.join(data_dir, "export.xml"), app.HEALTHKIT_TYPES)
+    return time.perf_counter() - start
+
+
+def _merge_screentime_csv(data_dir):
+    # Stands in for the former parse_screentime_csv: CSV extracts are now merged into the store
+    import screentime_store
+    store_dir = os.path.join(data_dir, "screentime")
+    shutil.rmtree(store_dir, ignore_errors=True)
+    start = time.perf_counter()
+    for path in sorted(glob.glob(os.path.join(data_dir, "screentime_data_*.csv"))):
+        screentime_store.merge(screentime_store.read_extract(path), store_dir, snapshot=False)
+    screentime_store.compact(store_dir)
+    return time.perf_counter() - start
+
+
+def _categorize_apps(data_dir):
+    import screentime_store
+    from categories import categorize_apps
+    screen_df = screentime_store.load_timeline(os.path.join(data_dir, "screentime"))
+    start = time.perf_counter()
+    categorize_apps(screen_df)
+    return time.perf_counter() - start
+
+
+def _setup_data(data_dir):
+    import app
+    start = time.perf_counter()
+    data = app.DataFrames(data_dir)
+    for field in ('usage_cube', 'screen_grouped', 'productivity_usage', 'health_timeline', 'heart_rate_df',
+                  'sleep_df', 'sleep_grouped', 'audio_exposure_df', 'audio_grouped'):
+        getattr(data, field)
+    return time.perf_counter() - start
+
+
+def _setup_data_cold(data_dir):
+    import healthkit
+    shutil.rmtree(os.path.join(data_dir, healthkit.CACHE_DIR_NAME), ignore_errors=True)
+    return _setup_data(data_dir)
+
+
+def _analyze_app_impact(data_dir):
+    import brain_rot
+    health_timeline = brain_rot.load_health_timeline(os.path.join(data_dir, "export.xml"))
+    screentime_df = brain_rot.load_screentime(os.path.join(data_dir, "screentime"))
+    app_name = screentime_df['app'].value_counts().index[0]
+    start = time.perf_counter()
+    brain_rot.analyze_app_impact(app_name, health_timeline, screentime_df)
+    return time.perf_counter() - start
+
+
+def _analyze_all_apps(data_dir):
+    import brain_rot
+    health_timeline = brain_rot.load_health_timeline(os.path.join(data_dir, "export.xml"))
+    screentime_df = brain_rot.load_screentime(os.path.join(data_dir, "screentime"))
+    start = time.perf_counter()
+    brain_rot.analyze_all_apps(health_timeline, screentime_df)
+    return time.perf_counter() - start
+
+
+# Run in order: later steps read the store and HealthKit cache written by earlier ones
+STEPS = {
+    'parse_healthkit_export': _parse_healthkit_export,
+    'parse_healthkit_types': _parse_healthkit_types,
+    'merge_screentime_csv': _merge_screentime_csv,
+    'categorize_apps': _categorize_apps,
+    'setup_data (cold cache)': _setup_data_cold,
+    'setup_data (warm cache)': _setup_data,
+    'analyze_app_impact': _analyze_app_impact,
+    'analyze_all_apps': _analyze_all_apps,
+}
+
+
+def _run_step(queue, name, data_dir):
+    seconds = STEPS[name](data_dir)
+    queue.put({
+        'name': name,
+        'seconds': round(seconds, 4),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT / 2**20, 1),
+        # Largest worker process, e.g. of the parallel HealthKit parser
+        'peak_worker_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * RSS_UNIT / 2**20, 1),
+    })
+
+
+def measure(name, data_dir):
+    """
+    Runs one step in a fresh process so its peak RSS is not inflated by earlier steps.
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_step, args=(queue, name, data_dir))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        return {'name': name, 'error': f"exit code {process.exitcode}"}
+    return queue.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing and analysis on synthetic data.")
+    parser.add_argument("--months", type=float, nargs="+", default=[1], help="Dataset sizes in months, e.g. 1 12 120 (default: %(default)s)")
+    parser.add_argument("--workdir", default="./benchmarks/work", help="Where generated datasets are kept (default: %(default)s)")
+    parser.add_argument("--output", default="./benchmarks/work/results.json", help="JSON results file (default: %(default)s)")
+    parser.add_argument("--heart-rate-interval", type=int, default=5, help="Seconds between heart rate samples (default: %(default)s)")
+    parser.add_argument("--sessions-per-day", type=int, default=150, help="Average Screen Time sessions per day (default: %(default)s)")
+    parser.add_argument("--steps", nargs="+", choices=list(STEPS), default=list(STEPS), help="Steps to run (default: all)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    runs = []
+    for months in args.months:
+        data_dir = os.path.join(args.workdir, f"{months:g}m-hr{args.heart_rate_interval}s-s{args.sessions_per_day}-seed{args.seed}")
+        info_path = os.path.join(data_dir, "dataset.json")
+        # Generated datasets are deterministic, so reuse one from an earlier run
+        if os.path.exists(info_path):
+            with open(info_path) as f:
+                dataset = json.load(f)
+        else:
+            os.makedirs(data_dir, exist_ok=True)
+            print(f"Generating {months:g} months of data in {data_dir}...", file=sys.stderr)
+            dataset = {
+                'healthkit_records': generate_export(os.path.join(data_dir, "export.xml"), months, args.heart_rate_interval, args.seed),
+                'screentime_rows': generate_screentime_csv(os.path.join(data_dir, "screentime_data_synthetic.csv"), months, args.sessions_per_day, args.seed),
+                'export_bytes': os.path.getsize(os.path.join(data_dir, "export.xml")),
+            }
+            with open(info_path, 'w') as f:
+                json.dump(dataset, f, indent=2)
+
+        steps = []
+        for name in args.steps:
+            print(f"[{months:g} months] {name}...", file=sys.stderr)
+            steps.append(measure(name, data_dir))
+        runs.append({'months': months, 'dataset': dataset, 'steps': steps})
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'runs': runs,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
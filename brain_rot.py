@@ -1,93 +1,350 @@
+import hashlib
+import json
+import os
 import streamlit as st
-import xml.etree.ElementTree as ET
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.express as px
-
-
-# Function to parse HealthKit export.xml
-def parse_healthkit_export(xml_file):
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-
-    # Extract relevant health metrics
-    health_data = []
-    for record in root.findall("Record"):
-        if record.attrib.get('type') in [
-            "HKQuantityTypeIdentifierHeartRate",
-            "HKQuantityTypeIdentifierHeartRateVariabilitySDNN",
-            "HKQuantityTypeIdentifierRestingHeartRate",
-            "HKQuantityTypeIdentifierWalkingHeartRateAverage",
-            "HKQuantityTypeIdentifierStepCount",
-        ]:
-            health_data.append({
-                "timestamp": record.attrib['startDate'],
-                "type": record.attrib['type'],
-                "value": float(record.attrib['value']),
-            })
-
-    health_df = pd.DataFrame(health_data)
-    health_df['timestamp'] = pd.to_datetime(health_df['timestamp'])
-    return health_df
-
-
-# Function to parse screentime CSV
-def parse_screentime_csv(csv_file):
-    screentime_df = pd.read_csv(csv_file)
-    screentime_df['start_time'] = pd.to_datetime(screentime_df['start_time'])
-    screentime_df['end_time'] = pd.to_datetime(screentime_df['end_time'])
+from healthkit import load_healthkit_types
+from health_timeline import HOUR_NS, HealthTimeline, nearest_index, to_ns
+import screentime_store
+
+BATCH_CACHE_DIR = "./data/brain_rot_cache"
+
+HEALTH_METRIC_TYPES = [
+    "HKQuantityTypeIdentifierHeartRate",
+    "HKQuantityTypeIdentifierHeartRateVariabilitySDNN",
+    "HKQuantityTypeIdentifierRestingHeartRate",
+    "HKQuantityTypeIdentifierWalkingHeartRateAverage",
+    "HKQuantityTypeIdentifierStepCount",
+]
+HEALTH_COLUMNS = ['startDate', 'value']
+
+
+def load_health_timeline(xml_file):
+    """
+    Loads the health metrics as a pre-sorted HealthTimeline.
+    """
+    return HealthTimeline.from_frames(load_healthkit_types(xml_file, HEALTH_METRIC_TYPES, columns=HEALTH_COLUMNS))
+
+
+# Function to load screentime from the consolidated store
+def load_screentime(store_dir):
+    screentime_df = screentime_store.load_timeline(store_dir, ['app', 'start_time', 'end_time'])
+    # Health timestamps are compared as naive UTC, so drop the timezone here too
+    screentime_df['start_time'] = screentime_df['start_time'].dt.tz_localize(None)
+    screentime_df['end_time'] = screentime_df['end_time'].dt.tz_localize(None)
     screentime_df['duration'] = (screentime_df['end_time'] - screentime_df['start_time']).dt.total_seconds() / 60
     return screentime_df
 
 
+def _window_ranges(hours, first_hour, last_hour):
+    """
+    Merges the hourly windows [hour + first_hour, hour + last_hour] around every sorted usage
+    hour into disjoint [start, end) ranges.
+    """
+    starts = hours + first_hour * HOUR_NS
+    ends = hours + (last_hour + 1) * HOUR_NS
+    if len(starts) == 0:
+        return starts, ends
+    # A new range begins wherever a window starts after every earlier window has ended
+    running_end = np.maximum.accumulate(ends)
+    new_range = np.ones(len(starts), dtype=bool)
+    new_range[1:] = starts[1:] > running_end[:-1]
+    range_starts = np.flatnonzero(new_range)
+    return starts[range_starts], np.maximum.reduceat(ends, range_starts)
+
+
+def _hours_in_ranges(range_starts, range_ends):
+    """
+    Lists every hour covered by the disjoint ranges.
+    """
+    lengths = (range_ends - range_starts) // HOUR_NS
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(range_starts, lengths) + offsets * HOUR_NS
+
+
+def _in_ranges(values, range_starts, range_ends):
+    """
+    Checks membership of each value in the disjoint [start, end) ranges.
+    """
+    index = np.searchsorted(range_starts, values, side='right') - 1
+    return (index >= 0) & (values < range_ends[np.maximum(index, 0)])
+
+
+def _nearest_samples(health_timeline, targets):
+    """
+    Type and value of the health sample nearest to each target time, across all metric types.
+    """
+    times, values, types = health_timeline.combined(HEALTH_METRIC_TYPES)
+    matched = nearest_index(times, targets)
+    return types[matched], values[matched]
+
+
+def _weighted_health_agg(health_timeline, period_hours, weights):
+    """
+    Mean and standard deviation per type of the health sample nearest to each period hour,
+    with every hour counted `weights` times.
+    """
+    columns = pd.MultiIndex.from_tuples([('type', ''), ('value', 'mean'), ('value', 'std')])
+    if len(health_timeline) == 0 or len(period_hours) == 0:
+        return pd.DataFrame(columns=columns)
+
+    types, values = _nearest_samples(health_timeline, period_hours)
+    codes = types.codes
+    n_types = len(types.categories)
+
+    present = np.bincount(codes, weights, minlength=n_types) > 0
+    valid_weights = np.where(np.isnan(values), 0, weights)
+    values = np.nan_to_num(values)
+    count = np.bincount(codes, valid_weights, minlength=n_types)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(codes, valid_weights * values, minlength=n_types) / count
+        squares = np.bincount(codes, valid_weights * (values - mean[codes]) ** 2, minlength=n_types)
+        std = np.where(count > 1, np.sqrt(squares / (count - 1)), np.nan)
+
+    health_agg = pd.DataFrame(
+        {('type', ''): types.categories[present], ('value', 'mean'): mean[present], ('value', 'std'): std[present]},
+        columns=columns,
+    )
+    return health_agg.sort_values(('type', '')).reset_index(drop=True)
+
+
 # Analyze 24-hour periods before and after app usage
-def analyze_app_impact(app_name, health_df, screentime_df):
+def analyze_app_impact(app_name, health_timeline, screentime_df):
     # Filter for the selected app usage
     app_usage = screentime_df[screentime_df['app'].str.contains(app_name, case=False, na=False)]
 
     # Get timestamps of app usage
-    app_hours = app_usage['start_time'].dt.floor('H').unique()
-
-    # Identify 24-hour periods before and after app usage
-    before_app_periods = []
-    after_app_periods = []
-    for hour in app_hours:
-        before_app_periods.extend(pd.date_range(start=hour - pd.Timedelta(hours=24), periods=24, freq='h'))
-        after_app_periods.extend(pd.date_range(start=hour, periods=24, freq='h'))
-
-    before_app_periods = pd.Series(before_app_periods)
-    after_app_periods = pd.Series(after_app_periods)
-
-    # Ensure timestamps are timezone-naive
-    health_df['timestamp'] = health_df['timestamp'].dt.tz_localize(None)
-
-    # Approximate match health data with periods
-    health_before = pd.merge_asof(
-        pd.DataFrame({'timestamp': before_app_periods}).sort_values(by='timestamp'),
-        health_df.sort_values(by='timestamp'),
-        on='timestamp',
-        direction='nearest'
-    )
-
-    health_after = pd.merge_asof(
-        pd.DataFrame({'timestamp': after_app_periods}).sort_values(by='timestamp'),
-        health_df.sort_values(by='timestamp'),
-        on='timestamp',
-        direction='nearest'
-    )
-
-    # Aggregate health data for comparison
-    health_agg_before = health_before.groupby('type').agg({'value': ['mean', 'std']}).reset_index()
-    health_agg_after = health_after.groupby('type').agg({'value': ['mean', 'std']}).reset_index()
+    app_hours = np.unique(to_ns(app_usage['start_time'].dt.floor('h')))
+    screentime_hours = to_ns(screentime_df['start_time'].dt.floor('h'))
+
+    results = []
+    # The 24 hours before each usage hour, and the usage hour plus the 23 after it
+    for first_hour, last_hour in [(-24, -1), (0, 23)]:
+        # Merge the overlapping windows into disjoint ranges instead of materializing every
+        # (possibly duplicated) hour, and count how many windows cover each hour
+        range_starts, range_ends = _window_ranges(app_hours, first_hour, last_hour)
+        period_hours = _hours_in_ranges(range_starts, range_ends)
+        weights = (
+            np.searchsorted(app_hours, period_hours - first_hour * HOUR_NS, side='right')
+            - np.searchsorted(app_hours, period_hours - last_hour * HOUR_NS, side='left')
+        ).astype(float)
+
+        # Approximate match health data with periods, then aggregate for comparison
+        health_agg = _weighted_health_agg(health_timeline, period_hours, weights)
+
+        # Aggregate screentime data for the period
+        in_period = _in_ranges(screentime_hours, range_starts, range_ends)
+        screentime_agg = screentime_df[in_period].groupby('app').agg({'duration': 'sum'}).reset_index()
+        results.append((health_agg, screentime_agg))
+
+    (health_agg_before, screentime_agg_before), (health_agg_after, screentime_agg_after) = results
+    return health_agg_before, health_agg_after, screentime_agg_before, screentime_agg_after
 
-    # Aggregate screentime data for before and after periods
-    screentime_before = screentime_df[screentime_df['start_time'].dt.floor('H').isin(before_app_periods)]
-    screentime_after = screentime_df[screentime_df['start_time'].dt.floor('H').isin(after_app_periods)]
 
-    screentime_agg_before = screentime_before.groupby('app').agg({'duration': 'sum'}).reset_index()
-    screentime_agg_after = screentime_after.groupby('app').agg({'duration': 'sum'}).reset_index()
+def _app_hour_counts(hour_index, app_codes, n_apps, n_hours):
+    """
+    Cumulative count of usage hours per app along the hourly grid (one extra leading zero column).
+    """
+    used = np.zeros((n_apps, n_hours), dtype=np.float64)
+    used[app_codes, hour_index] = 1
+    counts = np.zeros((n_apps, n_hours + 1), dtype=np.float64)
+    np.cumsum(used, axis=1, out=counts[:, 1:])
+    return counts
+
+
+def _weighted_moments(weights, indicator, values):
+    """
+    Weighted count, sum and sum of squares of `values` per row of `weights` and column of `indicator`.
+    """
+    count = weights @ indicator
+    total = weights @ (indicator * values[:, None])
+    squares = weights @ (indicator * (values ** 2)[:, None])
+    return count, total, squares
+
+
+def _mean_std(count, total, squares):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        variance = np.maximum(squares - count * mean ** 2, 0) / (count - 1)
+    return mean, np.sqrt(np.where(count > 1, variance, np.nan))
+
+
+# Analyze every app (or the top N by usage) in one pass over the hourly timelines
+def analyze_all_apps(health_timeline, screentime_df, top_n=None, block_size=64):
+    """
+    Ranks apps by how health metrics and overall screen time differ in the 24 hours after
+    usage versus the 24 hours before, using the same nearest-sample matching and window
+    weighting as `analyze_app_impact` (apps are matched exactly rather than by substring).
+
+    Health metrics and screen time are laid out once on a shared hourly grid. Per-app window
+    weights come from cumulative sums of each app's usage hours, and the aggregates for a block
+    of apps are a few matrix products. Effect sizes are Cohen's d (after minus before).
+    """
+    columns = ['app', 'metric', 'before_mean', 'after_mean', 'before_std', 'after_std',
+               'before_hours', 'after_hours', 'effect_size']
+    screentime_df = screentime_df.dropna(subset=['app', 'start_time'])
+    if screentime_df.empty or len(health_timeline) == 0:
+        return pd.DataFrame(columns=columns)
+
+    apps = screentime_df.groupby('app', observed=True)['duration'].sum().sort_values(ascending=False).index
+    if top_n:
+        apps = apps[:top_n]
+
+    # Shared hourly grid, padded by a day on both sides so every window fits
+    health_ns = health_timeline.combined(HEALTH_METRIC_TYPES)[0]
+    screentime_hours = to_ns(screentime_df['start_time'].dt.floor('h'))
+    grid_start = min(screentime_hours.min(), health_ns.min() // HOUR_NS * HOUR_NS) - 24 * HOUR_NS
+    grid_end = max(screentime_hours.max(), health_ns.max()) + 25 * HOUR_NS
+    n_hours = int((grid_end - grid_start) // HOUR_NS)
+    grid = grid_start + np.arange(n_hours, dtype=np.int64) * HOUR_NS
+    hour_index = (screentime_hours - grid_start) // HOUR_NS
+
+    # Health sample nearest to every grid hour, one indicator column per metric
+    types, values = _nearest_samples(health_timeline, grid)
+    # Only metrics that are the nearest sample to some grid hour get a column
+    types = types.remove_unused_categories()
+    types = types.reorder_categories(sorted(types.categories))
+    indicator = np.zeros((n_hours, len(types.categories)))
+    indicator[np.arange(n_hours), types.codes] = ~np.isnan(values)
+    values = np.nan_to_num(values)
+
+    # Total screen time (minutes) started in each grid hour
+    screen_minutes = np.bincount(hour_index, screentime_df['duration'].to_numpy(dtype=float), minlength=n_hours)
+    screen_indicator = np.ones((n_hours, 1))
+
+    metrics = list(types.categories) + ['Screen time (min/hour)']
+    app_codes = pd.Categorical(screentime_df['app'], categories=apps).codes
+    rows = []
+    for block_start in range(0, len(apps), block_size):
+        block_apps = apps[block_start:block_start + block_size]
+        in_block = (app_codes >= block_start) & (app_codes < block_start + len(block_apps))
+        counts = _app_hour_counts(hour_index[in_block], app_codes[in_block] - block_start, len(block_apps), n_hours)
+        padded = np.pad(counts, ((0, 0), (24, 24)), mode='edge')
+
+        stats = {}
+        # Grid hour t is k hours after usage hour h when h = t - k; windows cover k in [-24, -1] and [0, 23]
+        for period, (first_hour, last_hour) in {'before': (-24, -1), 'after': (0, 23)}.items():
+            upper = padded[:, 24 + 1 - first_hour:24 + 1 - first_hour + n_hours]
+            lower = padded[:, 24 - last_hour:24 - last_hour + n_hours]
+            weights = upper - lower
+            health_mean, health_std = _mean_std(*_weighted_moments(weights, indicator, values))
+            health_hours = weights @ indicator
+            covered = (weights > 0).astype(np.float64)
+            screen_mean, screen_std = _mean_std(*_weighted_moments(covered, screen_indicator, screen_minutes))
+            stats[period] = (
+                np.hstack([health_mean, screen_mean]),
+                np.hstack([health_std, screen_std]),
+                np.hstack([health_hours, covered.sum(axis=1, keepdims=True)]),
+            )
 
-    return health_agg_before, health_agg_after, screentime_agg_before, screentime_agg_after
+        (before_mean, before_std, before_n), (after_mean, after_std, after_n) = stats['before'], stats['after']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pooled = np.sqrt(((before_n - 1) * before_std ** 2 + (after_n - 1) * after_std ** 2) / (before_n + after_n - 2))
+            effect = (after_mean - before_mean) / pooled
+        for app_offset, app in enumerate(block_apps):
+            for metric_index, metric in enumerate(metrics):
+                rows.append((
+                    app, metric,
+                    before_mean[app_offset, metric_index], after_mean[app_offset, metric_index],
+                    before_std[app_offset, metric_index], after_std[app_offset, metric_index],
+                    before_n[app_offset, metric_index], after_n[app_offset, metric_index],
+                    effect[app_offset, metric_index],
+                ))
+
+    results = pd.DataFrame(rows, columns=columns)
+    results = results.replace([np.inf, -np.inf], np.nan)
+    order = results['effect_size'].abs().sort_values(ascending=False, na_position='last').index
+    return results.loc[order].reset_index(drop=True)
+
+
+def _file_stats(paths):
+    return [[path, os.stat(path).st_size, os.stat(path).st_mtime_ns] for path in paths]
+
+
+def _screentime_parts(screentime_dir):
+    parts = sorted(file for file in os.listdir(screentime_dir) if file.endswith('.parquet'))
+    return [os.path.join(screentime_dir, file) for file in parts]
+
+
+def _fingerprint(stats):
+    return hashlib.sha1(json.dumps(stats).encode()).hexdigest()[:16]
+
+
+def _batch_cache_path(healthkit_file, screentime_dir, top_n):
+    """
+    Cache file for batch results, keyed on the size and mtime of the inputs.
+    """
+    key = _fingerprint(_file_stats([healthkit_file] + _screentime_parts(screentime_dir)) + [top_n])
+    return os.path.join(BATCH_CACHE_DIR, f"app_impact_{key}.parquet")
+
+
+@st.cache_resource(max_entries=1)
+def _cached_screentime(screentime_dir, fingerprint):
+    return load_screentime(screentime_dir)
+
+
+@st.cache_resource(max_entries=1)
+def _cached_health_timeline(healthkit_file, fingerprint):
+    return load_health_timeline(healthkit_file)
+
+
+def cached_health_timeline(healthkit_file):
+    """
+    `load_health_timeline`, kept in memory across reruns until the export changes, so the
+    samples are sorted once rather than on every widget change.
+    """
+    return _cached_health_timeline(healthkit_file, _fingerprint(_file_stats([healthkit_file])))
+
+
+def cached_screentime(screentime_dir):
+    """
+    `load_screentime`, kept in memory across reruns until the store's parts change.
+    """
+    return _cached_screentime(screentime_dir, _fingerprint(_file_stats(_screentime_parts(screentime_dir))))
+
+
+def load_all_apps_impact(healthkit_file, screentime_dir, top_n=None):
+    """
+    Returns the ranked batch results, computing them only when the inputs changed since the last run.
+
+    On a cache hit neither the health metrics nor the Screen Time store are loaded.
+    """
+    cache_path = _batch_cache_path(healthkit_file, screentime_dir, top_n)
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+    results = analyze_all_apps(cached_health_timeline(healthkit_file), cached_screentime(screentime_dir), top_n)
+    os.makedirs(BATCH_CACHE_DIR, exist_ok=True)
+    results.to_parquet(cache_path, index=False)
+    # Only the latest inputs are ever looked up again, so drop the results of older ones
+    for name in os.listdir(BATCH_CACHE_DIR):
+        path = os.path.join(BATCH_CACHE_DIR, name)
+        if name.startswith("app_impact_") and name.endswith(".parquet") and path != cache_path:
+            os.remove(path)
+    return results
+
+
+def show_all_apps_impact(healthkit_file, screentime_dir):
+    st.write("Ranking apps by the change in health metrics and screen time in the 24 hours after use:")
+    top_n = st.number_input("Number of most-used apps to analyze (0 for all):", min_value=0, value=50, step=10)
+    results = load_all_apps_impact(healthkit_file, screentime_dir, int(top_n) or None)
+
+    metric = st.selectbox("Metric:", ["All metrics"] + sorted(results['metric'].unique()))
+    if metric != "All metrics":
+        results = results[results['metric'] == metric]
+    st.dataframe(results)
+
+    fig = px.bar(
+        results.head(20),
+        x='effect_size',
+        y=results.head(20)['app'] + ' · ' + results.head(20)['metric'],
+        orientation='h',
+        labels={'effect_size': "Effect Size (Cohen's d, after - before)", 'y': 'App · Metric'},
+        title="Largest Before/After Effects"
+    )
+    st.plotly_chart(fig)
 
 
 def main():
@@ -99,13 +356,19 @@ def main():
 
     # File upload
     healthkit_file = "./data/export.xml"
-    screentime_file = "./data/screentime_data_2024-12-19 20:27:29.388001.csv"
+    screentime_dir = screentime_store.STORE_DIR
+
+    if healthkit_file and screentime_dir:
+        mode = st.radio("Analysis mode:", ["Single app", "All apps (ranked)"])
+        if mode == "All apps (ranked)":
+            # Only loads the inputs when the ranked results are not cached yet
+            show_all_apps_impact(healthkit_file, screentime_dir)
+            return
 
-    if healthkit_file and screentime_file:
         # Parse data
         st.write("Parsing files...")
-        health_df = parse_healthkit_export(healthkit_file)
-        screentime_df = parse_screentime_csv(screentime_file)
+        health_timeline = cached_health_timeline(healthkit_file)
+        screentime_df = cached_screentime(screentime_dir)
 
         # App picker
         st.write("Select an app to analyze:")
@@ -115,7 +378,7 @@ def main():
             # Analyze app impact
             st.write(f"Analyzing data for 24-hour periods before and after {app_name} usage...")
             health_agg_before, health_agg_after, screentime_agg_before, screentime_agg_after = analyze_app_impact(
-                app_name, health_df, screentime_df
+                app_name, health_timeline, screentime_df
             )
 
             # Display aggregated health data
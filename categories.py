@@ -1,574 +1,187 @@
-def categorize_apps(df):
-    """
-    Categorize apps into detailed productivity levels given a screentime dataframe.
-    """
-    # Define app categories with finer granularity
-    app_categories = {
-    # Development Tools
-    'com.microsoft.VSCode': 'Development',
-    'com.apple.dt.Xcode': 'Development',
-    'com.figma.Desktop': 'Development',
-    'com.github.GitHubDesktop': 'Development',
-    'cc.arduino.IDE2': 'Development',
-    'app.codeedit.CodeEdit': 'Development',
-    'com.roadesign.Codyeapp': 'Development',
-    'org.openmv.openmvide': 'Development',
-    'com.oracle.workbench.MySQLWorkbench': 'Development',
-    'com.apple.dt.AutomationModeUI': 'Development',
-    'com.apple.Terminal': 'Development',
-    'com.apple.dt.CommandLineTools.installondemand': 'Development',
-
-    # Marketing
-    'com.apple.FinalCutTrial': 'Marketing',
-    'com.Ai.NeuroNote': 'Development',  # As per your instruction
-    'com.Ai.NeuroNote3': 'Development',  # As per your instruction
-    'com.hnc.Discord': 'Social Media',  # Special case
-    'company.thebrowser.Browser': 'Development',  # As per your instruction
-    'com.hammerandchisel.discord': 'Social Media',
-    'com.github.GitHubClient': 'Development',
-    'com.framer.electron': 'Development',  # Assuming creative/development hybrid
-    'com.nvidia.gfnpc.mall': 'Entertainment',  # Gaming/Entertainment
-    'com.apple.VoiceOver': 'Utility',  # System Utility
+import json
+import os
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
 
-    # Social Media
-    'com.hnc.Discord': 'Social Media',  # Special case
-    'com.apple.FaceTime': 'Social Media',
-    'com.apple.findmy': 'Utility',
-    'com.apple.VoiceOver': 'Utility',
-    'com.apple.Spotlight': 'Utility',
+# Category rules (exact bundle IDs, prefix/suffix families, regexes and web domains) and the parent taxonomy
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "category_rules.json")
 
-    # Creative
-    'com.canva.CanvaDesktop': 'Development',  # As per your instruction
-    'com.framer.electron': 'Development',  # As per your instruction
-    'com.apple.FontBook': 'Creative',
-    'com.apple.Photos': 'Creative',
-    'com.apple.GenerativePlaygroundApp': 'Creative',
-    'com.apple.FolderActionsSetup': 'Creative',
+# Host of a URL: optional scheme and userinfo, then everything up to the port, path, query or fragment
+URL_HOST_PATTERN = r'^(?:[A-Za-z][A-Za-z0-9+.-]*://)?(?:[^@/?#]*@)?([^/:?#]*)'
+# Second-level labels under country-code TLDs that act as public suffixes (co.uk, com.au, ...)
+SECOND_LEVEL_SUFFIXES = frozenset({'ac', 'co', 'com', 'edu', 'gov', 'net', 'ne', 'or', 'org'})
+# Entries kept by the per-bundle-ID and per-host lookup caches, which outlive any single upload
+LOOKUP_CACHE_SIZE = 65536
 
-    # Entertainment
-    'com.netflix.Netflix': 'Entertainment',
-    'com.apple.Music': 'Entertainment',
-    'com.apple.PhotoBooth': 'Entertainment',
-    'com.apple.Chess': 'Entertainment',
-    'com.apple.TV': 'Entertainment',
 
-    # Browsing
-    'com.google.Chrome': 'Browsing',
-    'com.apple.Safari': 'Browsing',
+class Trie:
+    """
+    Character trie returning the value of the longest stored key that prefixes a string.
+    """
 
-    # AI Productivity
-    'com.openai.chat': 'Development',  # As per your instruction
-    'com.Ai.NeuroNote': 'Development',
-    'com.Ai.NeuroNote3': 'Development',
+    def __init__(self, items=()):
+        self.root = {}
+        for key, value in items:
+            self.insert(key, value)
+
+    def insert(self, key, value):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+        node[None] = value
+
+    def longest_prefix(self, text):
+        node = self.root
+        match = node.get(None)
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            match = node.get(None, match)
+        return match
+
+
+class CategoryMatcher:
+    """
+    Compiled category rules, evaluated in priority order: exact bundle ID, longest prefix,
+    longest suffix, then the first matching regex. Anything else is 'Other'. Web hosts are
+    matched separately against the longest `domains` rule they end with.
+    """
 
-    # Utility
-    'com.apple.calculator': 'Utility',
-    'com.apple.Dictionary': 'Utility',
-    'com.apple.DiskUtility': 'Utility',
-    'com.apple.finder': 'Utility',
-    'com.apple.Maps': 'Utility',
-    'com.apple.SystemPreferences': 'Utility',
-    'com.apple.Terminal': 'Development',  # Also fits Utility
-    'com.apple.VoiceMemos': 'Utility',
-    'com.apple.reminders': 'Utility',
-    'com.apple.notes': 'Utility',
-    'com.apple.calendar': 'Utility',
-    'com.apple.ActivityMonitor': 'Utility',
-    'com.apple.Console': 'Utility',
-    'com.apple.DigitalColorMeter': 'Utility',
-    'com.apple.DiskUtility': 'Utility',
-    'com.apple.FontBook': 'Creative',
-    'com.apple.GenerativePlaygroundApp': 'Creative',
-    'com.apple.launchpad.launcher': 'Utility',
-    'com.apple.mail': 'Utility',
-    'com.apple.Passwords': 'Utility',
-    'com.apple.Preview': 'Utility',
-    'com.apple.TextEdit': 'Utility',
-    'com.apple.QuickTimePlayerX': 'Entertainment',
-    'com.apple.screencaptureui': 'Utility',
-    'com.apple.scriptEditor': 'Utility',
-    # ... Add additional Utility apps as needed
+    def __init__(self, rules):
+        self.exact = dict(rules.get('exact', {}))
+        self.prefixes = Trie(rules.get('prefix', {}).items())
+        # Suffixes are matched as prefixes of the reversed string
+        self.suffixes = Trie((suffix[::-1], category) for suffix, category in rules.get('suffix', {}).items())
+        self.regex_categories = [rule['category'] for rule in rules.get('regex', [])]
+        self.regex = re.compile('|'.join(
+            f"(?P<r{index}>{rule['pattern']})" for index, rule in enumerate(rules.get('regex', []))
+        )) if self.regex_categories else None
+        # Domains match on whole trailing labels: '.github.com' reversed prefixes 'gist.github.com'
+        self.domains = Trie(((f".{domain.lower()}")[::-1], category) for domain, category in rules.get('domains', {}).items())
+        self.parents = dict(rules.get('parents', {}))
+        self.category = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._category)
+        self.domain_category = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._domain_category)
+
+    def _category(self, app):
+        if not isinstance(app, str):
+            return 'Other'
+        category = self.exact.get(app) or self.prefixes.longest_prefix(app) or self.suffixes.longest_prefix(app[::-1])
+        if category is None and self.regex is not None:
+            match = self.regex.search(app)
+            if match:
+                category = self.regex_categories[int(match.lastgroup[1:])]
+        return category or 'Other'
+
+    def _domain_category(self, host):
+        if not isinstance(host, str) or not host:
+            return 'Other'
+        return self.domains.longest_prefix(f".{host}"[::-1]) or 'Other'
+
+    def categories(self):
+        """
+        Returns every category the rules can produce.
+        """
+        values = set(self.exact.values()) | set(self.regex_categories) | {'Other'}
+        for trie in (self.prefixes, self.suffixes, self.domains):
+            stack = [trie.root]
+            while stack:
+                node = stack.pop()
+                values.update(value for key, value in node.items() if key is None)
+                stack.extend(child for key, child in node.items() if key is not None)
+        return values
+
+
+def load_rules(path=RULES_FILE):
+    """
+    Loads and compiles the category rules file.
+    """
+    with open(path) as f:
+        return CategoryMatcher(json.load(f))
 
-    # System
-    'com.apple.MRT': 'System',
-    'com.apple.XProtectFramework.XProtect': 'System',
-    'com.apple.SyncServices.AppleMobileDeviceHelper': 'System',
-    'com.apple.SyncServices.AppleMobileSync': 'System',
-    'com.apple.MobileDeviceUpdater': 'System',
-    'com.apple.ScriptEditor.id.cocoa-applet-template': 'System',
-    'com.apple.ScriptEditor.id.droplet-with-settable-properties-template': 'System',
-    'com.apple.ScriptEditor.id.file-processing-droplet-template': 'System',
-    'com.apple.ScriptEditor.id.image-file-processing-droplet-template': 'System',
-    'com.apple.python3': 'System',
-    'com.apple.print.AirScanLegacyDiscovery': 'System',
-    'com.apple.AppStore': 'Utility',  # System App
-    'com.apple.Automator': 'Utility',  # System App
-    'com.apple.iBooksX': 'Entertainment',  # System App
-    'com.apple.calculator': 'Utility',  # System App
-    'com.apple.iCal': 'Utility',  # System App
-    'com.apple.Chess': 'Entertainment',  # System App
-    'com.apple.clock': 'Utility',  # System App
-    'com.apple.AddressBook': 'Utility',  # System App
-    'com.apple.Dictionary': 'Utility',  # System App
-    'com.apple.FaceTime': 'Social Media',  # System App
-    'com.apple.findmy': 'Utility',  # System App
-    'com.apple.FontBook': 'Creative',  # System App
-    'com.apple.freeform': 'Creative',  # System App
-    'com.apple.Home': 'Utility',  # System App
-    'com.apple.Image_Capture': 'Utility',  # System App
-    'com.apple.GenerativePlaygroundApp': 'Creative',  # System App
-    'com.apple.launchpad.launcher': 'Utility',  # System App
-    'com.apple.mail': 'Utility',  # System App
-    'com.apple.Maps': 'Utility',  # System App
-    'com.apple.MobileSMS': 'Utility',  # System App
-    'com.apple.exposelauncher': 'Utility',  # System App
-    'com.apple.Music': 'Entertainment',  # System App
-    'com.apple.news': 'Entertainment',  # System App
-    'com.apple.Notes': 'Utility',  # System App
-    'com.apple.Passwords': 'Utility',  # System App
-    'com.apple.PhotoBooth': 'Entertainment',  # System App
-    'com.apple.Photos': 'Creative',  # System App
-    'com.apple.podcasts': 'Entertainment',  # System App
-    'com.apple.Preview': 'Utility',  # System App
-    'com.apple.QuickTimePlayerX': 'Entertainment',  # System App
-    'com.apple.reminders': 'Utility',  # System App
-    'com.apple.shortcuts': 'Productive',  # System App
-    'com.apple.siri.launcher': 'Utility',  # System App
-    'com.apple.Stickies': 'Utility',  # System App
-    'com.apple.stocks': 'Entertainment',  # System App
-    'com.apple.systempreferences': 'Utility',  # System App
-    'com.apple.TV': 'Entertainment',  # System App
-    'com.apple.TextEdit': 'Utility',  # System App
-    'com.apple.backup.launcher': 'Utility',  # System App
-    'com.apple.helpviewer': 'Utility',  # System App
-    'com.apple.ActivityMonitor': 'Utility',  # System App
-    'com.apple.airport.airportutility': 'Utility',  # System App
-    'com.apple.audio.AudioMIDISetup': 'Utility',  # System App
-    'com.apple.BluetoothFileExchange': 'Utility',  # System App
-    'com.apple.bootcampassistant': 'Utility',  # System App
-    'com.apple.ColorSyncUtility': 'Utility',  # System App
-    'com.apple.Console': 'Utility',  # System App
-    'com.apple.DigitalColorMeter': 'Utility',  # System App
-    'com.apple.DiskUtility': 'Utility',  # System App
-    'com.apple.grapher': 'Utility',  # System App
-    'com.apple.MigrateAssistant': 'Utility',  # System App
-    'com.apple.printcenter': 'Utility',  # System App
-    'com.apple.ScreenSharing': 'Utility',  # System App
-    'com.apple.screenshot.launcher': 'Utility',  # System App
-    'com.apple.ScriptEditor2': 'Utility',  # System App
-    'com.apple.SystemProfiler': 'Utility',  # System App
-    'com.apple.Terminal': 'Development',  # System App
-    'com.apple.VoiceOverUtility': 'Utility',  # System App
-    'com.apple.VoiceMemos': 'Utility',  # System App
-    'com.apple.weather': 'Utility',  # System App
-    'com.apple.ScreenContinuity': 'Utility',  # System App
 
-    # Other Applications
-    'com.if.Amphetamine': 'Marketing',  # As per your instruction
-    'com.apple.configurator.ui': 'Utility',  # Apple Configurator
-    'company.thebrowser.Browser': 'Browsing',  # As per your instruction
-    'com.goodsnooze.bakery': 'Marketing',  # Assumed based on name
-    'com.nonstrict.Bezel-appstore': 'Unknown',  # Limited info
-    'org.blenderfoundation.blender': 'Development',  # Blender is 3D modeling
-    'com.canva.CanvaDesktop': 'Development',  # As per your instruction
-    'com.openai.chat': 'Development',  # As per your instruction
-    'com.macpaw.CleanMyMac-mas': 'Utility',
-    'app.codeedit.CodeEdit': 'Development',
-    'com.roadesign.Codyeapp': 'Development',
-    'de.ixeau.Curve': 'Development',  # Assumed
-    'com.lukilabs.lukiapp': 'Marketing',  # As per your instruction
-    'app.diagrams.DiagramsMac.mas': 'Development',
-    'com.hnc.Discord': 'Social Media',
-    'com.docker.docker': 'Development',
-    'com.figma.Desktop': 'Development',  # As per your instruction
-    'com.apple.FinalCutTrial': 'Marketing',  # As per your instruction
-    'com.framer.electron': 'Development',  # As per your instruction
-    'com.nvidia.gfnpc.mall': 'Entertainment',
-    'com.github.GitHubClient': 'Development',
-    'com.google.Chrome': 'Browsing',
-    'com.jomo.Jomo': 'Unknown',  # Limited info
-    'ai.elementlabs.lmstudio': 'Development',  # Assumed
-    'com.microsoft.teams': 'School',
-    'com.microsoft.Word': 'School',
-    'com.oracle.workbench.MySQLWorkbench': 'Development',
-    'com.Ai.NeuroNote': 'Development',
-    'notion.id': 'Productive',  # Notion is productivity
-    'com.apple.iWork.Numbers': 'Development',
-    'com.electron.ollama': 'Development',
-    'org.openmv.openmvide': 'Development',
-    'com.postmanlabs.mac': 'Development',
-    'org.prismlauncher.PrismLauncher': 'Development',
-    'org.raspberrypi.imagingutility': 'Utility',
-    'com.apple.RealityConverter': 'Development',  # Reality Converter is AR-related
-    'com.swiftLee.RocketSim': 'Development',
-    'com.mortenjust.Rendermock': 'Development',
-    'com.apple.SFSymbols-beta': 'Development',
-    'com.apple.Safari': 'Browsing',
-    'com.timpler.screenstudio': 'Marketing',
-    'com.tinyspeck.slackmacgap': 'Social Media',
-    'com.sebvidal.Snippet': 'Development',
-    'dev.erikschnell.CodeSnippets': 'Development',
-    'com.termius.mac': 'Development',
-    'com.apple.TestFlight': 'Development',  # TestFlight is for testing apps
-    'com.install4j.1106-5897-7327-6550.5': 'School',  # Visual Paradigm is UML tool
-    'com.microsoft.VSCode': 'Development',
-    'com.apple.dt.Xcode': 'Development',
-    'io.balena.etcher': 'Development',
-    'com.mlobodzinski.Stoic': 'Development',
-    'us.zoom.xos': 'Marketing',
-    'com.apple.MRT': 'System',
-    'com.apple.XProtectFramework.XProtect': 'System',
-    'com.apple.SyncServices.AppleMobileDeviceHelper': 'System',
-    'com.apple.SyncServices.AppleMobileSync': 'System',
-    'com.apple.MobileDeviceUpdater': 'System',
-    'com.apple.ScriptEditor.id.cocoa-applet-template': 'System',
-    'com.apple.ScriptEditor.id.droplet-with-settable-properties-template': 'System',
-    'com.apple.ScriptEditor.id.file-processing-droplet-template': 'System',
-    'com.apple.ScriptEditor.id.image-file-processing-droplet-template': 'System',
-    'com.apple.python3': 'System',
-    'com.apple.print.AirScanLegacyDiscovery': 'System',
-    'com.apple.AppStore': 'Utility',
-    'com.apple.Automator': 'Utility',
-    'com.apple.iBooksX': 'Entertainment',
-    'com.apple.calculator': 'Utility',
-    'com.apple.iCal': 'Utility',
-    'com.apple.Chess': 'Entertainment',
-    'com.apple.clock': 'Utility',
-    'com.apple.AddressBook': 'Utility',
-    'com.apple.Dictionary': 'Utility',
-    'com.apple.FaceTime': 'Social Media',
-    'com.apple.findmy': 'Utility',
-    'com.apple.FontBook': 'Creative',
-    'com.apple.freeform': 'Creative',
-    'com.apple.Home': 'Utility',
-    'com.apple.Image_Capture': 'Utility',
-    'com.apple.GenerativePlaygroundApp': 'Creative',
-    'com.apple.launchpad.launcher': 'Utility',
-    'com.apple.mail': 'Utility',
-    'com.apple.Maps': 'Utility',
-    'com.apple.MobileSMS': 'Utility',
-    'com.apple.exposelauncher': 'Utility',
-    'com.apple.Music': 'Entertainment',
-    'com.apple.news': 'Entertainment',
-    'com.apple.Notes': 'Utility',
-    'com.apple.Passwords': 'Utility',
-    'com.apple.PhotoBooth': 'Entertainment',
-    'com.apple.Photos': 'Creative',
-    'com.apple.podcasts': 'Entertainment',
-    'com.apple.Preview': 'Utility',
-    'com.apple.QuickTimePlayerX': 'Entertainment',
-    'com.apple.reminders': 'Utility',
-    'com.apple.shortcuts': 'Productive',
-    'com.apple.siri.launcher': 'Utility',
-    'com.apple.Stickies': 'Utility',
-    'com.apple.stocks': 'Entertainment',
-    'com.apple.systempreferences': 'Utility',
-    'com.apple.TV': 'Entertainment',
-    'com.apple.TextEdit': 'Utility',
-    'com.apple.backup.launcher': 'Utility',
-    'com.apple.helpviewer': 'Utility',
-    'com.apple.ActivityMonitor': 'Utility',
-    'com.apple.airport.airportutility': 'Utility',
-    'com.apple.audio.AudioMIDISetup': 'Utility',
-    'com.apple.BluetoothFileExchange': 'Utility',
-    'com.apple.bootcampassistant': 'Utility',
-    'com.apple.ColorSyncUtility': 'Utility',
-    'com.apple.Console': 'Utility',
-    'com.apple.DigitalColorMeter': 'Utility',
-    'com.apple.DiskUtility': 'Utility',
-    'com.apple.grapher': 'Utility',
-    'com.apple.MigrateAssistant': 'Utility',
-    'com.apple.printcenter': 'Utility',
-    'com.apple.ScreenSharing': 'Utility',
-    'com.apple.screenshot.launcher': 'Utility',
-    'com.apple.ScriptEditor2': 'Utility',
-    'com.apple.SystemProfiler': 'Utility',
-    'com.apple.Terminal': 'Development',
-    'com.apple.VoiceOverUtility': 'Utility',
-    'com.apple.VoiceMemos': 'Utility',
-    'com.apple.weather': 'Utility',
-    'com.apple.ScreenContinuity': 'Utility',
+MATCHER = load_rules()
+APP_CATEGORIES = MATCHER.exact
+PARENT_CATEGORIES = MATCHER.parents
 
-    # Helper and System Services (categorized as 'System')
-    'com.apple.ClassroomStudentMenuExtra': 'System',
-    'com.apple.ColorSyncCalibrator': 'System',
-    'com.apple.AOSUIPrefPaneLauncher': 'System',
-    'com.apple.AVB-Audio-Configuration': 'System',
-    'com.apple.print.add': 'System',
-    'com.apple.AddressBook.UrlForwarder': 'System',
-    'com.apple.AirPlayUIAgent': 'System',
-    'com.apple.AirPortBaseStationAgent': 'System',
-    'com.apple.AppleScriptUtility': 'System',
-    'com.apple.AboutThisMacLauncher': 'System',
-    'com.apple.archiveutility': 'Utility',
-    'com.apple.DVDPlayer': 'Entertainment',
-    'com.apple.DeskCam': 'Utility',
-    'com.apple.DirectoryUtility': 'Utility',
-    'com.apple.ExpansionSlotUtility': 'Utility',
-    'com.apple.appleseed.FeedbackAssistant': 'Utility',
-    'com.apple.FolderActionsSetup': 'Creative',
-    'com.apple.keychainaccess': 'Utility',
-    'com.apple.Ticket-Viewer': 'Utility',
-    'com.apple.wifi.diagnostics': 'Utility',
-    'com.apple.IPAInstaller': 'Utility',
-    'com.apple.AskToMessagesHost': 'Utility',
-    'com.apple.Automator.Automator-Application-Stub': 'Utility',
-    'com.apple.AutomatorInstaller': 'Utility',
-    'com.apple.Batteries': 'Utility',
-    'com.apple.BluetoothSetupAssistant': 'Utility',
-    'com.apple.BluetoothUIServer': 'Utility',
-    'com.apple.BluetoothUIService': 'Utility',
-    'com.apple.CalendarFileHandler': 'Utility',
-    'com.apple.CaptiveNetworkAssistant': 'Utility',
-    'com.apple.CertificateAssistant': 'Utility',
-    'com.apple.controlcenter': 'Utility',
-    'com.apple.controlstrip': 'Utility',
-    'com.apple.CoreLocationAgent': 'Utility',
-    'com.apple.coreservices.uiagent': 'Utility',
-    'com.apple.NewDeviceOutreachApp': 'Utility',
-    'com.apple.databaseevents': 'Utility',
-    'com.apple.DiagnosticsReporter': 'Utility',
-    'com.apple.DiscHelper': 'Utility',
-    'com.apple.DiskImageMounter': 'Utility',
-    'com.apple.dock': 'Utility',
-    'com.apple.DwellControl': 'Utility',
-    'com.apple.EnhancedLogging': 'Utility',
-    'com.apple.EraseAssistant': 'Utility',
-    'com.apple.EscrowSecurityAlert': 'Utility',
-    'com.apple.Family': 'Utility',
-    'com.apple.FileProvider-Feedback': 'Utility',
-    'com.apple.Finder': 'Utility',
-    'com.apple.FolderActionsDispatcher': 'Utility',
-    'com.apple.gamecenter': 'Entertainment',
-    'com.apple.IOUIAgent': 'Utility',
-    'com.apple.imageevents': 'Utility',
-    'com.apple.dt.CommandLineTools.installondemand': 'Development',
-    'com.apple.PackageUIKit.Install-in-Progress': 'Utility',
-    'com.apple.Installer-Progress': 'Utility',
-    'com.apple.installer': 'Utility',
-    'com.apple.JavaLauncher': 'Development',
-    'com.apple.KeyboardAccessAgent': 'Utility',
-    'com.apple.KeyboardSetupAssistant': 'Utility',
-    'com.apple.security.Keychain-Circle-Notification': 'Utility',
-    'com.apple.Language-Chooser': 'Utility',
-    'com.apple.MTLReplayer': 'Utility',
-    'com.apple.ManagedClient': 'Utility',
-    'com.apple.MediaMLPluginApp': 'Utility',
-    'com.apple.MemorySlotUtility': 'Utility',
-    'com.apple.musicrecognition.mac': 'Entertainment',
-    'com.apple.NetAuthAgent': 'Utility',
-    'com.apple.notificationcenterui': 'Utility',
-    'com.apple.NowPlayingTouchUI': 'Utility',
-    'com.apple.OBEXAgent': 'Utility',
-    'com.apple.ODSAgent': 'Utility',
-    'com.apple.OSDUIHelper': 'Utility',
-    'com.apple.PIPAgent': 'Utility',
-    'com.apple.PairedDevices': 'Utility',
-    'com.apple.Pass-Viewer': 'Utility',
-    'com.apple.PeopleMessageService': 'Utility',
-    'com.apple.PeopleViewService': 'Utility',
-    'com.apple.PowerChime': 'Utility',
-    'com.apple.PreviewShell': 'Utility',
-    'com.apple.displaycalibrator': 'Utility',
-    'com.apple.ProblemReporter': 'Utility',
-    'com.apple.mcx.ProfileHelper': 'Utility',
-    'com.apple.RapportUIAgent': 'Utility',
-    'com.apple.pluginIM.pluginIMRegistrator': 'Utility',
-    'com.apple.RemoteDesktopAgent': 'Utility',
-    'com.apple.RemoteDesktopMessageAgent': 'Utility',
-    'com.apple.SSMenuAgent': 'Utility',
-    'com.apple.OAHSoftwareUpdateApp': 'Utility',
-    'com.apple.ScreenTimeWidgetApplication': 'Utility',
-    'com.apple.ScreenSaver.Engine': 'Utility',
-    'com.apple.ScriptMenuApp': 'Utility',
-    'com.apple.ScriptMonitor': 'Utility',
-    'com.apple.SetupAssistant': 'Utility',
-    'com.apple.shortcuts.droplet': 'Utility',
-    'com.apple.shortcuts.events': 'Utility',
-    'com.apple.ShortcutsActions': 'Utility',
-    'com.apple.Siri': 'Utility',
-    'com.apple.SoftwareUpdate': 'Utility',
-    'com.apple.SpacesTouchBarAgent': 'Utility',
-    'com.apple.Spotlight': 'Utility',
-    'com.apple.windowmanager.StageManagerOnboarding': 'Utility',
-    'com.apple.systemevents': 'Utility',
-    'com.apple.systemuiserver': 'Utility',
-    'com.apple.TextInputMenuAgent': 'Utility',
-    'com.apple.TextInputSwitcher': 'Utility',
-    'com.apple.ThermalTrap': 'Utility',
-    'com.apple.timemachine.HelperAgent': 'Utility',
-    'com.apple.tips': 'Utility',
-    'com.apple.UIKitSystemApp': 'Utility',
-    'com.apple.UniversalAccessControl': 'Utility',
-    'com.apple.universalcontrol': 'Utility',
-    'com.apple.UnmountAssistantAgent': 'Utility',
-    'com.apple.UserNotificationCenter': 'Utility',
-    'com.apple.VoiceOver': 'Utility',
-    'com.apple.wallpaper.agent': 'Utility',
-    'com.apple.WatchFaceAlert': 'Utility',
-    'com.apple.wifi.WiFiAgent': 'Utility',
-    'com.apple.widgetkit.simulator': 'Utility',
-    'com.apple.WindowManager': 'Utility',
-    'com.apple.windowmanager.ShowDesktopEducation': 'Utility',
-    'com.apple.WorkoutAlert-Mac': 'Utility',
-    'com.apple.icq': 'Utility',
-    'com.apple.CloudKit.ShareBear': 'Utility',
-    'com.apple.loginwindow': 'System',
-    'com.apple.rcd': 'System',
-    'com.apple.screencaptureui': 'Utility',
-    'com.apple.AddressBook.sync': 'Utility',
-    'com.apple.ABAssistantService': 'Utility',
-    'com.apple.AddressBook.abd': 'Utility',
-    'com.apple.AddressBookSourceSync': 'Utility',
-    'com.apple.FontRegistryUIAgent': 'Utility',
-    'com.apple.speech.synthesis.SpeechSynthesisServer': 'Utility',
-    'com.apple.CMViewSrvc': 'Utility',
-    'com.apple.ContinuityCaptureOnboardingUI': 'Utility',
-    'com.apple.ctkbind': 'Utility',
-    'com.apple.quicklook.qlmanage': 'Utility',
-    'com.apple.QuickLookDaemon': 'Utility',
-    'com.apple.quicklook.QuickLookSimulator': 'Utility',
-    'com.apple.quicklook.ui.helper': 'Utility',
-    'com.apple.syncserver': 'Utility',
-    'com.tcltk.wish': 'Development',  # Tcl/Tk interpreter
-    'com.apple.BuildWebPage': 'Development',
-    'com.apple.MakePDF': 'Development',
-    'com.apple.AirScanScanner': 'Utility',
-    'com.apple.50onPaletteIM': 'Utility',
-    'com.apple.inputmethod.Ainu': 'Utility',
-    'com.apple.inputmethod.AssistiveControl': 'Utility',
-    'com.apple.CharacterPaletteIM': 'Utility',
-    'com.apple.inputmethod.ironwood': 'Utility',
-    'com.apple.EmojiFunctionRowItem-Container': 'Utility',
-    'com.apple.JapaneseIM.KanaTyping': 'Utility',
-    'com.apple.JapaneseIM.RomajiTyping': 'Utility',
-    'com.apple.KIM-Container': 'Utility',
-    'com.apple.inputmethod.PluginIM': 'Utility',
-    'com.apple.PAH-Container': 'Utility',
-    'com.apple.SCIM-Container': 'Utility',
-    'com.apple.TCIM-Container': 'Utility',
-    'com.apple.TYIM-Container': 'Utility',
-    'com.apple.inputmethod.Tamil': 'Utility',
-    'com.apple.TrackpadIM-Container': 'Utility',
-    'com.apple.TransliterationIM-Container': 'Utility',
-    'com.apple.VIM-Container': 'Utility',
-    'com.apple.iCloudUserNotificationsd': 'Utility',
-    'com.apple.AOSAlertManager': 'Utility',
-    'com.apple.AOSHeartbeat': 'Utility',
-    'com.apple.AOSPushRelay': 'Utility',
-    'com.apple.accessibility.LiveTranscriptionAgent': 'Utility',
-    'com.apple.accessibility.LiveSpeech': 'Utility',
-    'com.apple.AccessibilityVisualsAgent': 'Utility',
-    'com.apple.Calibration-Assistant': 'Utility',
-    'com.apple.AppSSOAgent': 'Utility',
-    'com.apple.KerberosMenuExtra': 'Utility',
-    'com.apple.AMSEngagementViewService': 'Utility',
-    'com.apple.AskPermissionUI': 'Utility',
-    'com.apple.AutoFillPanelService': 'Utility',
-    'com.apple.dt.AutomationModeUI': 'Development',
-    'com.apple.backgroundtaskmanagement.agent': 'Utility',
-    'com.apple.bird': 'Utility',
-    'com.apple.storeuid': 'Utility',
-    'com.apple.CCE.CIMFindInputCode': 'Utility',
-    'com.apple.FollowUpUI': 'Utility',
-    'com.apple.frameworks.diskimages.diuiagent': 'Utility',
-    'com.apple.eap8021x.eaptlstrust': 'Utility',
-    'com.apple.familycontrols.useragent': 'Utility',
-    'com.apple.FeedbackRemoteView': 'Utility',
-    'com.apple.FindMyMacMessenger': 'Utility',
-    'com.apple.identityservicesd': 'Utility',
-    'com.apple.idsfoundation.IDSRemoteURLConnectionAgent': 'Utility',
-    'com.apple.imagent': 'Utility',
-    'com.apple.IMAutomaticHistoryDeletionAgent': 'Utility',
-    'com.apple.imtransferservices.IMTransferAgent': 'Utility',
-    'com.apple.nbagent': 'Utility',
-    'com.apple.LinkedNotesUIService': 'Utility',
-    'com.apple.privatecloudcomputed': 'Utility',
-    'com.apple.ScreenReaderUIServer': 'Utility',
-    'com.apple.VoiceOverQuickstart': 'Utility',
-    'com.apple.AquaAppearanceHelper': 'Utility',
-    'com.apple.sociallayerd': 'Utility',
-    'com.apple.SoftwareUpdateNotificationManager': 'Utility',
-    'com.apple.speech.SpeechDataInstallerd': 'Utility',
-    'com.apple.speech.SpeechRecognitionServer': 'Utility',
-    'com.apple.STMFramework.UIHelper': 'Utility',
-    'com.apple.syncservices.ConflictResolver': 'Utility',
-    'com.apple.syncservices.syncuid': 'Utility',
-    'com.apple.accessibility.AXVisualSupportAgent': 'Utility',
-    'com.apple.AccessibilityOnboarding': 'Utility',
-    'com.apple.accessibility.DFRHUD': 'Utility',
-    'com.apple.accessibility.universalAccessAuthWarn': 'Utility',
-    'com.apple.coreservices.UASharedPasteboardProgressUI': 'Utility',
-    'com.apple.ChineseTextConverterService': 'Utility',
-    'com.apple.SummaryService': 'Utility',
+# Lookup tables compiled once at import: every category and parent category gets a fixed
+# integer code, and each category code maps straight to its parent's code
+CATEGORY_DTYPE = pd.CategoricalDtype(sorted(MATCHER.categories()))
+PARENT_CATEGORY_DTYPE = pd.CategoricalDtype(sorted(set(PARENT_CATEGORIES.values()) | {'Other'}))
+_CATEGORY_CODES = {category: code for code, category in enumerate(CATEGORY_DTYPE.categories)}
+_PARENT_CODE_BY_CATEGORY_CODE = np.array([
+    PARENT_CATEGORY_DTYPE.categories.get_loc(PARENT_CATEGORIES.get(category, 'Other'))
+    for category in CATEGORY_DTYPE.categories
+])
 
-    # Applications Without Info.plist
-    # These are typically system apps or incomplete installations. Categorize as 'System' or 'Unknown'
-    'Bento|Craft.app': 'Unknown',
-    'My School.app': 'Unknown',
-    'Odio.app': 'Unknown',
-    'SchoolMate.app': 'Unknown',
-    'liquiddetectiond.app': 'System',
-    'monitorproduct': 'Utility',
-    'Cisco-Systems.Spark': 'Social Media',
-    'Cisco-Systems.Spark': 'Social Media',  # Duplicate, same category
-    'WebEx-PT.webexAppLauncher': 'Social Media',
-    'us.zoom.ZoomAutoUpdater': 'Marketing',
-    'com.apple.systemevents': 'Utility',
-    'com.apple.windowmanager.ShowDesktopEducation': 'Utility',
-    'com.apple.QuickLookDaemon': 'Utility',
-    # ... add any remaining apps with "Info.plist not found"
 
-    # Developer Builds and Derived Data
-    'com.Ai.NeuroNote3': 'Development',
-    # Additional Derived Data entries categorized as 'Development'
-    'com.apple.BuildWebPage': 'Development',
-    'com.apple.MakePDF': 'Development',
-    'com.apple.AirScanScanner': 'Utility',
-    'com.apple.50onPaletteIM': 'Utility',
-    'com.apple.inputmethod.Ainu': 'Utility',
-    'com.apple.inputmethod.AssistiveControl': 'Utility',
-    'com.apple.CharacterPaletteIM': 'Utility',
-    'com.apple.inputmethod.ironwood': 'Utility',
-    'com.apple.EmojiFunctionRowItem-Container': 'Utility',
-    'com.apple.JapaneseIM.KanaTyping': 'Utility',
-    'com.apple.JapaneseIM.RomajiTyping': 'Utility',
-    'com.apple.KIM-Container': 'Utility',
-    'com.apple.inputmethod.PluginIM': 'Utility',
-    'com.apple.PAH-Container': 'Utility',
-    'com.apple.SCIM-Container': 'Utility',
-    'com.apple.TCIM-Container': 'Utility',
-    'com.apple.TYIM-Container': 'Utility',
-    'com.apple.inputmethod.Tamil': 'Utility',
-    'com.apple.TrackpadIM-Container': 'Utility',
-    'com.apple.TransliterationIM-Container': 'Utility',
-    'com.apple.VIM-Container': 'Utility',
-    # ... continue for all derived data apps
+def categorize_apps(df):
+    """
+    Categorize apps into detailed productivity levels given a screentime dataframe.
 
-    # Dotnet Shared Apps (System Utilities)
-    'com.dotnet.shared.Microsoft.AspNetCore.App': 'System',
-    'com.dotnet.shared.Microsoft.NETCore.App': 'System',
-    # ... continue as needed
+    Each distinct bundle ID is matched against the rules once (and memoized across calls);
+    `app`, `category` and `parent_category` are returned as categoricals on a new DataFrame.
+    """
+    apps = df['app'].astype('category')
+    app_codes = apps.cat.codes.to_numpy()
+
+    # Categorize each distinct app once, then broadcast the integer codes to every row.
+    # A trailing 'Other' slot catches missing apps (code -1).
+    category_codes = np.array(
+        [_CATEGORY_CODES[MATCHER.category(app)] for app in apps.cat.categories]
+        + [_CATEGORY_CODES['Other']],
+        dtype=np.int16,
+    )[app_codes]
+    parent_codes = _PARENT_CODE_BY_CATEGORY_CODE[category_codes]
+
+    return df.assign(
+        app=apps,
+        category=pd.Categorical.from_codes(category_codes, dtype=CATEGORY_DTYPE),
+        parent_category=pd.Categorical.from_codes(parent_codes, dtype=PARENT_CATEGORY_DTYPE),
+    )
+
+
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def registrable_domain(host):
+    """
+    Approximates the registrable domain of a host (the part a person registers, e.g.
+    'bbc.co.uk' for 'www.news.bbc.co.uk') without the full Public Suffix List.
+    """
+    labels = host.split('.')
+    if host.replace('.', '').isdigit():
+        return host
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in SECOND_LEVEL_SUFFIXES:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
 
-    # Default Category for Uncategorized Apps
-    # Any Bundle ID not explicitly listed will be categorized as 'Unknown'
-}
 
-    # Apply categories to the DataFrame
-    df['category'] = df['app'].map(app_categories).fillna('Other')
-    
-    # Optional: Add hierarchical categories
-    parent_categories = {
-        'Development': 'Productive',
-        'Marketing': 'Productive',
-        'Creative': 'Productive',
-        'Social Media': 'Distracting',
-        'Entertainment': 'Distracting',
-        'Utility': 'Neutral',
-        'Browsing': 'Neutral',
-        'AI Productivity': 'Productive',
-        'Other': 'Unknown'
-    }
-    df['parent_category'] = df['category'].map(parent_categories).fillna('Other')
+def categorize_domains(df, url_col='URL'):
+    """
+    Categorize browser visits by the domain of their URL.
 
-    return df
\ No newline at end of file
+    Hosts are extracted from every URL with one vectorized regex, and each distinct host is
+    matched against the `domains` rules once (and memoized across calls). `domain` (the
+    registrable domain), `category` and `parent_category` are returned as categoricals on a
+    new DataFrame, using the same category codes as `categorize_apps`.
+    """
+    hosts = df[url_col].astype('str').str.extract(URL_HOST_PATTERN, expand=False).str.lower().str.rstrip('.')
+    host_codes, unique_hosts = pd.factorize(hosts)
+
+    # Work per distinct host, then broadcast the integer codes to every row. A trailing slot
+    # catches missing URLs (code -1).
+    domain_codes, unique_domains = pd.factorize(pd.Index([registrable_domain(host) for host in unique_hosts]))
+    domain_codes = np.append(domain_codes, -1)[host_codes]
+    category_codes = np.array(
+        [_CATEGORY_CODES[MATCHER.domain_category(host)] for host in unique_hosts]
+        + [_CATEGORY_CODES['Other']],
+        dtype=np.int16,
+    )[host_codes]
+    parent_codes = _PARENT_CODE_BY_CATEGORY_CODE[category_codes]
+
+    return df.assign(
+        domain=pd.Categorical.from_codes(domain_codes, categories=unique_domains),
+        category=pd.Categorical.from_codes(category_codes, dtype=CATEGORY_DTYPE),
+        parent_category=pd.Categorical.from_codes(parent_codes, dtype=PARENT_CATEGORY_DTYPE),
+    )
@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+
+HOUR_NS = 3600 * 10**9
+
+
+def to_ns(timestamps):
+    """
+    Converts a datetime Series (naive UTC or timezone-aware) to int64 nanoseconds since the epoch.
+    """
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_convert('UTC').dt.tz_localize(None)
+    return timestamps.to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+def nearest_index(sorted_times, targets, direction='nearest'):
+    """
+    Index of the matching sorted time for each target, or -1 when there is none.
+
+    `direction` follows merge_asof: 'backward' takes the last time <= target, 'forward' the
+    first time >= target, and 'nearest' the closer of the two, preferring backward on ties.
+    """
+    backward = np.searchsorted(sorted_times, targets, side='right') - 1
+    if direction == 'backward':
+        return backward
+    forward = np.searchsorted(sorted_times, targets, side='left')
+    forward = np.where(forward < len(sorted_times), forward, -1)
+    if direction == 'forward':
+        return forward
+    backward_gap = targets - sorted_times[np.maximum(backward, 0)]
+    forward_gap = sorted_times[np.maximum(forward, 0)] - targets
+    use_backward = (backward >= 0) & ((forward < 0) | (backward_gap <= forward_gap))
+    return np.where(use_backward, backward, forward)
+
+
+class HealthTimeline:
+    """
+    HealthKit samples kept pre-sorted per record type as contiguous int64-nanosecond arrays.
+
+    Built once per dataset so analyses can answer range, nearest-sample and window-aggregate
+    queries with `searchsorted` instead of re-sorting the samples on every call.
+    """
+
+    def __init__(self):
+        self._times = {}
+        self._values = {}
+        # Cumulative sums of values and valid-sample counts, for O(1) window means
+        self._value_sums = {}
+        self._value_counts = {}
+        self._combined = {}
+
+    @classmethod
+    def from_frames(cls, health_dfs, time_col='startDate'):
+        """
+        Builds a timeline from a dict of per-type DataFrames (as returned by `load_healthkit_types`).
+        """
+        timeline = cls()
+        for data_type, df in health_dfs.items():
+            if df.empty:
+                timeline._add(data_type, np.empty(0, dtype=np.int64), np.empty(0))
+            else:
+                timeline._add(data_type, to_ns(df[time_col]), pd.to_numeric(df['value'], errors='coerce').to_numpy(dtype=float))
+        return timeline
+
+    def _add(self, data_type, times, values):
+        order = np.argsort(times, kind='stable')
+        times, values = times[order], values[order]
+        self._times[data_type] = times
+        self._values[data_type] = values
+        valid = ~np.isnan(values)
+        self._value_sums[data_type] = np.concatenate([[0.0], np.cumsum(np.where(valid, values, 0.0))])
+        self._value_counts[data_type] = np.concatenate([[0], np.cumsum(valid)])
+
+    @property
+    def types(self):
+        return list(self._times)
+
+    def times(self, data_type):
+        return self._times.get(data_type, np.empty(0, dtype=np.int64))
+
+    def values(self, data_type):
+        return self._values.get(data_type, np.empty(0))
+
+    def __len__(self):
+        return sum(len(times) for times in self._times.values())
+
+    def range(self, data_type, start, end):
+        """
+        Times and values of the samples with start <= time < end (int64 nanoseconds).
+        """
+        times = self.times(data_type)
+        lo, hi = np.searchsorted(times, [start, end], side='left')
+        return times[lo:hi], self.values(data_type)[lo:hi]
+
+    def nearest(self, data_type, targets, direction='nearest'):
+        """
+        Value of the matching sample for each target time (int64 nanoseconds), NaN when there is none.
+        """
+        times = self.times(data_type)
+        if len(times) == 0:
+            return np.full(len(targets), np.nan)
+        index = nearest_index(times, np.asarray(targets, dtype=np.int64), direction)
+        return np.where(index >= 0, self.values(data_type)[np.maximum(index, 0)], np.nan)
+
+    def _window_bounds(self, data_type, starts, ends):
+        """
+        Sorted-sample index range [lo, hi) of each [start, end) window, plus the windows' start order.
+
+        The windows are looked up in start order so the binary searches sweep the samples
+        front to back instead of jumping around a large array.
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        times = self.times(data_type)
+        order = np.argsort(starts, kind='stable')
+        lo = np.empty(len(starts), dtype=np.int64)
+        hi = np.empty(len(starts), dtype=np.int64)
+        lo[order] = np.searchsorted(times, starts[order], side='left')
+        hi[order] = np.searchsorted(times, ends[order], side='left')
+        return lo, np.maximum(hi, lo), order
+
+    def _window_count_mean(self, data_type, lo, hi):
+        counts = self._value_counts.get(data_type, np.zeros(1, dtype=np.int64))
+        sums = self._value_sums.get(data_type, np.zeros(1))
+        count = counts[hi] - counts[lo]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, (sums[hi] - sums[lo]) / count, np.nan)
+        return count, mean
+
+    def window_mean(self, data_type, starts, ends):
+        """
+        Count of valid samples and their mean value in each [start, end) window.
+        """
+        lo, hi, _ = self._window_bounds(data_type, starts, ends)
+        return self._window_count_mean(data_type, lo, hi)
+
+    def window_stats(self, data_type, starts, ends):
+        """
+        Count, mean, min and max of the valid samples in each [start, end) window.
+
+        The windows are swept in start order and each one reduces its slice of the sorted
+        samples with `reduceat`, so m windows over n samples cost O(m log m + n + total
+        window length) rather than a join of every window with every sample.
+        """
+        lo, hi, order = self._window_bounds(data_type, starts, ends)
+        count, mean = self._window_count_mean(data_type, lo, hi)
+        minimum = np.full(len(lo), np.nan)
+        maximum = np.full(len(lo), np.nan)
+        nonempty = order[hi[order] > lo[order]]
+        if len(nonempty):
+            # A trailing NaN keeps every window end a valid reduceat index; the odd slices
+            # (from one window's end to the next one's start) are discarded
+            values = np.append(self.values(data_type), np.nan)
+            bounds = np.empty(2 * len(nonempty), dtype=np.int64)
+            bounds[0::2], bounds[1::2] = lo[nonempty], hi[nonempty]
+            minimum[nonempty] = np.fmin.reduceat(values, bounds)[0::2]
+            maximum[nonempty] = np.fmax.reduceat(values, bounds)[0::2]
+        return count, mean, minimum, maximum
+
+    def hour_of_day_mean(self, data_type, timezone=None):
+        """
+        Mean value per local hour of the day as a DataFrame with `hour` and `value` columns.
+
+        HealthKit dates are stored in UTC, so hours are taken in `timezone` (default: this
+        machine's local timezone) to line up with the local Screen Time hours.
+        """
+        times, values = self.times(data_type), self.values(data_type)
+        valid = ~np.isnan(values)
+        hours = pd.DatetimeIndex(times[valid], tz='UTC').tz_convert(timezone or tzlocal()).hour.to_numpy()
+        count = np.bincount(hours, minlength=24)
+        total = np.bincount(hours, values[valid], minlength=24)
+        observed = count > 0
+        return pd.DataFrame({'hour': np.arange(24)[observed], 'value': total[observed] / count[observed]})
+
+    def combined(self, data_types=None):
+        """
+        Every sample of the given types merged into one time-sorted view.
+
+        Returns (times, values, types) where `types` is a Categorical; samples with equal times
+        keep the order of `data_types`.
+        """
+        data_types = tuple(data_types or self.types)
+        if data_types in self._combined:
+            return self._combined[data_types]
+        times = np.concatenate([self.times(data_type) for data_type in data_types] or [np.empty(0, dtype=np.int64)])
+        values = np.concatenate([self.values(data_type) for data_type in data_types] or [np.empty(0)])
+        codes = np.repeat(np.arange(len(data_types)), [len(self.times(data_type)) for data_type in data_types])
+        order = np.argsort(times, kind='stable')
+        combined = times[order], values[order], pd.Categorical.from_codes(codes[order], categories=list(data_types))
+        self._combined[data_types] = combined
+        return combined
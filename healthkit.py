@@ -0,0 +1,440 @@
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import chain, repeat
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CACHE_DIR_NAME = "healthkit_cache"
+MANIFEST_FILE = "manifest.json"
+# Bumped whenever the stored column layout changes, so older caches are rebuilt
+SCHEMA_VERSION = 2
+# Record attributes kept by default; others (sourceVersion, device, ...) are dropped while parsing
+RECORD_COLUMNS = ('type', 'sourceName', 'unit', 'creationDate', 'startDate', 'endDate', 'value')
+DATE_COLUMNS = ('creationDate', 'startDate', 'endDate')
+# Category samples store an enum name as their value; keep the HealthKit integer code instead
+CATEGORY_VALUE_CODES = {
+    'HKCategoryValueSleepAnalysisInBed': 0,
+    'HKCategoryValueSleepAnalysisAsleep': 1,
+    'HKCategoryValueSleepAnalysisAsleepUnspecified': 1,
+    'HKCategoryValueSleepAnalysisAwake': 2,
+    'HKCategoryValueSleepAnalysisAsleepCore': 3,
+    'HKCategoryValueSleepAnalysisAsleepDeep': 4,
+    'HKCategoryValueSleepAnalysisAsleepREM': 5,
+}
+EXPORT_DATE_FORMAT = "%Y-%m-%d %H:%M:%S %z"
+# UTC offsets range from -12:00 to +14:00
+MAX_UTC_OFFSET_SPAN = timedelta(hours=14)
+# Top-level records are indented by a single space in Apple's exports; nested ones by more
+RECORD_BOUNDARY = b'\n <Record '
+ROOT_CLOSE = b'</HealthData>'
+# Files smaller than this are not worth splitting across processes
+MIN_CHUNK_BYTES = 16 * 1024 * 1024
+READ_BLOCK_BYTES = 1024 * 1024
+
+
+def _record_watermark(record):
+    """
+    Returns the date string used to order a record for incremental ingestion.
+    """
+    return record.get('creationDate') or record.get('startDate')
+
+
+def _parse_export_date(value):
+    return datetime.strptime(value, EXPORT_DATE_FORMAT)
+
+
+# Character positions in "YYYY-MM-DD HH:MM:SS +HHMM"
+EXPORT_DATE_LENGTH = 25
+_DIGIT_POSITIONS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18, 21, 22, 23, 24]
+_SEPARATORS = {4: '-', 7: '-', 10: ' ', 13: ':', 16: ':', 19: ' '}
+_NAT = np.iinfo(np.int64).min
+_MONTH_LENGTHS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def _days_from_civil(year, month, day):
+    """
+    Days since 1970-01-01 for proleptic Gregorian dates (H. Hinnant's algorithm, vectorized).
+    """
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def _parse_unique_dates(values):
+    """
+    Parses an array of distinct export date strings to int64 UTC nanoseconds.
+
+    Well-formed strings are decoded with integer arithmetic on their characters; anything
+    else falls back to `pd.to_datetime` (NaT when unparseable).
+    """
+    # One extra character reveals strings that are longer than the fixed format
+    chars = np.asarray(values, dtype=f'U{EXPORT_DATE_LENGTH + 1}').view(np.uint32)
+    chars = chars.reshape(len(values), EXPORT_DATE_LENGTH + 1).astype(np.int64)
+    digits = chars[:, _DIGIT_POSITIONS] - ord('0')
+    valid = (chars[:, EXPORT_DATE_LENGTH] == 0) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    for position, separator in _SEPARATORS.items():
+        valid &= chars[:, position] == ord(separator)
+    sign = np.where(chars[:, 20] == ord('-'), -1, 1)
+    valid &= (chars[:, 20] == ord('+')) | (chars[:, 20] == ord('-'))
+
+    def number(first, last):
+        result = np.zeros(len(values), dtype=np.int64)
+        for position in range(first, last):
+            result = result * 10 + digits[:, position]
+        return result
+
+    year, month, day = number(0, 4), number(4, 6), number(6, 8)
+    hour, minute, second = number(8, 10), number(10, 12), number(12, 14)
+    offset = sign * (number(14, 16) * 3600 + number(16, 18) * 60)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_length = _MONTH_LENGTHS[np.clip(month, 1, 12) - 1] + ((month == 2) & leap)
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_length) & (hour < 24) & (minute < 60) & (second < 60)
+
+    seconds = _days_from_civil(year, month, day) * 86400 + hour * 3600 + minute * 60 + second - offset
+    result = np.where(valid, seconds * 10**9, _NAT)
+    if not valid.all():
+        fallback = pd.to_datetime(pd.Series(values[~valid], dtype=object), utc=True, errors='coerce', format='mixed')
+        result[~valid] = fallback.dt.as_unit('ns').to_numpy(dtype='datetime64[ns]').view(np.int64)
+    return result
+
+
+def parse_export_dates(values):
+    """
+    Parses HealthKit export dates ("2024-03-01 08:15:22 -0800") to a datetime64[ns, UTC] Series.
+
+    Exports repeat the same timestamps many times (startDate often equals endDate and
+    creationDate), so each distinct string is parsed once and the results are broadcast back.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    parsed = _parse_unique_dates(np.asarray(uniques, dtype=object))
+    nanoseconds = np.where(codes >= 0, parsed[np.maximum(codes, 0)] if len(parsed) else _NAT, _NAT)
+    return pd.Series(nanoseconds.view('datetime64[ns]')).dt.tz_localize('UTC')
+
+
+def _is_not_after(value, threshold):
+    """
+    Checks whether an export date string is at or before a (wall-clock prefix, UTC datetime) threshold.
+
+    Export dates carry their own UTC offset, so a plain string comparison is only conclusive
+    when the wall-clock time is more than the largest offset span below the threshold; only
+    records close to the threshold pay for a real datetime parse.
+    """
+    prefix, threshold_dt = threshold
+    if value[:19] < prefix:
+        return True
+    return _parse_export_date(value) <= threshold_dt
+
+
+def _iter_range_events(xml_file, start, end):
+    """
+    Streams parse events for bytes [start, end) of the export, wrapped in a synthetic root element.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    parser.feed(b'<HealthData>')
+    with open(xml_file, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(READ_BLOCK_BYTES, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            parser.feed(block)
+            yield from parser.read_events()
+    parser.feed(ROOT_CLOSE)
+    parser.close()
+    yield from parser.read_events()
+
+
+def iter_records(xml_file, data_types=None, since=None, byte_range=None):
+    """
+    Streams the top-level <Record> elements of a HealthKit export.xml and yields their attributes.
+
+    The file is read with iterparse and every top-level element is detached from the root as
+    soon as it has been consumed, so memory stays flat no matter how large the export is.
+    Records nested inside other elements (e.g. <Correlation>) are skipped, matching
+    `root.findall("Record")`.
+
+    `since` optionally maps a type identifier to a timezone-aware datetime; records of that
+    type whose creationDate (or startDate) is not newer are dropped before they are yielded.
+
+    `byte_range` optionally restricts parsing to a (start, end) slice produced by `_record_ranges`.
+    """
+    thresholds = {
+        data_type: ((threshold - MAX_UTC_OFFSET_SPAN).strftime('%Y-%m-%d %H:%M:%S'), threshold)
+        for data_type, threshold in (since or {}).items()
+        if threshold is not None
+    }
+    if byte_range is None:
+        context = ET.iterparse(xml_file, events=('start', 'end'))
+    else:
+        context = _iter_range_events(xml_file, *byte_range)
+    _, root = next(context)
+    depth = 0
+    for event, elem in context:
+        if event == 'start':
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 0:
+            continue
+        if elem.tag == 'Record' and (data_types is None or elem.get('type') in data_types):
+            threshold = thresholds.get(elem.get('type'))
+            if threshold is None or not _is_not_after(_record_watermark(elem.attrib), threshold):
+                yield elem.attrib
+        # Drop the finished element (and its children) from the tree
+        root.clear()
+
+
+def _parse_values(values):
+    raw = pd.Series(values, dtype=object)
+    numeric = pd.to_numeric(raw, errors='coerce')
+    if numeric.isna().any():
+        numeric = numeric.fillna(raw.map(CATEGORY_VALUE_CODES))
+    return numeric.astype('float32')
+
+
+def _columns_to_dataframe(data):
+    """
+    Builds a compact DataFrame from per-attribute lists of raw strings: UTC datetime64
+    dates, float32 values and categorical codes for every other attribute.
+    """
+    n_rows = len(next(iter(data.values()), []))
+    date_columns = [column for column in data if column in DATE_COLUMNS]
+    # Parse all date columns together so strings shared between them are decoded once
+    dates = parse_export_dates(list(chain.from_iterable(data[column] for column in date_columns)))
+    typed = {}
+    for column, values in data.items():
+        if column in DATE_COLUMNS:
+            index = date_columns.index(column)
+            typed[column] = dates.iloc[index * n_rows:(index + 1) * n_rows].reset_index(drop=True)
+        elif column == 'value':
+            typed[column] = _parse_values(values)
+        else:
+            typed[column] = pd.Categorical(pd.Series(values, dtype='str'))
+    return pd.DataFrame(typed)
+
+
+def _next_record_offset(f, offset):
+    """
+    Offset of the first top-level <Record at or after `offset`, or None.
+    """
+    f.seek(offset)
+    carry = b''
+    while True:
+        block = f.read(READ_BLOCK_BYTES)
+        if not block:
+            return None
+        data = carry + block
+        index = data.find(RECORD_BOUNDARY)
+        if index >= 0:
+            # Skip the newline so the range starts at the record's indentation
+            return offset - len(carry) + index + 1
+        carry = data[-(len(RECORD_BOUNDARY) - 1):]
+        offset += len(block)
+
+
+def _record_ranges(xml_file, n_chunks):
+    """
+    Splits the export's top-level elements into up to `n_chunks` byte ranges that each start
+    on a top-level <Record, or returns None when the file does not have the expected layout.
+    """
+    size = os.path.getsize(xml_file)
+    with open(xml_file, 'rb') as f:
+        first = _next_record_offset(f, 0)
+        f.seek(max(size - READ_BLOCK_BYTES, 0))
+        tail_start = f.tell()
+        close = f.read().rfind(ROOT_CLOSE)
+        if first is None or close < 0:
+            return None
+        last = tail_start + close
+        boundaries = [first]
+        for k in range(1, n_chunks):
+            offset = _next_record_offset(f, first + (last - first) * k // n_chunks)
+            if offset is not None and boundaries[-1] < offset < last:
+                boundaries.append(offset)
+    return list(zip(boundaries, boundaries[1:] + [last]))
+
+
+def _concat_frames(dfs, columns):
+    """
+    Concatenates typed record frames, merging their categories instead of falling back to strings.
+    """
+    if len(dfs) == 1:
+        return dfs[0]
+    # An attribute missing from every record of a frame can come back with untyped empty categories
+    return pd.DataFrame({
+        column: union_categoricals(
+            [df[column].cat.set_categories(df[column].cat.categories.astype('str')) for df in dfs], sort_categories=True
+        )
+        if isinstance(dfs[0][column].dtype, pd.CategoricalDtype)
+        else pd.concat([df[column] for df in dfs], ignore_index=True)
+        for column in columns
+    })
+
+
+def _parse_range(xml_file, data_types, since, columns, byte_range):
+    data_by_type = {data_type: {column: [] for column in columns} for data_type in data_types}
+    for record in iter_records(xml_file, data_by_type.keys(), since, byte_range):
+        for column, values in data_by_type[record['type']].items():
+            values.append(record.get(column))
+    return {data_type: _columns_to_dataframe(data) for data_type, data in data_by_type.items()}
+
+
+def parse_healthkit_types(xml_file, data_types, since=None, columns=RECORD_COLUMNS, workers=None):
+    """
+    Parses several record types from the HealthKit XML export.
+
+    Returns a dict mapping each requested type identifier to its DataFrame; types with no
+    records map to an empty DataFrame. Only the attributes in `columns` are collected, one
+    list per attribute, so no per-record dict outlives the parse. See `iter_records` for `since`.
+
+    Large exports are split into byte ranges on top-level <Record boundaries and parsed by a
+    pool of `workers` processes (default: one per CPU). The per-range frames are concatenated
+    in file order, so the result is the same as a serial parse.
+    """
+    data_types = list(data_types)
+    workers = workers or os.cpu_count() or 1
+    n_chunks = min(4 * workers, math.ceil(os.path.getsize(xml_file) / MIN_CHUNK_BYTES))
+    ranges = _record_ranges(xml_file, n_chunks) if workers > 1 and n_chunks > 1 else None
+    if not ranges or len(ranges) == 1:
+        return _parse_range(xml_file, data_types, since, columns, None)
+
+    # Spawn rather than fork: the caller may be a multithreaded server (e.g. a Streamlit script thread)
+    with ProcessPoolExecutor(min(workers, len(ranges)), mp_context=multiprocessing.get_context('spawn')) as pool:
+        parts = list(pool.map(
+            _parse_range, repeat(xml_file), repeat(data_types), repeat(since), repeat(columns), ranges
+        ))
+    return {data_type: _concat_frames([part[data_type] for part in parts], columns) for data_type in data_types}
+
+
+def parse_healthkit_export(xml_file, data_type, columns=RECORD_COLUMNS):
+    """
+    Parses the HealthKit XML export file and returns a DataFrame of the specified data type.
+    """
+    return parse_healthkit_types(xml_file, [data_type], columns=columns)[data_type]
+
+
+def export_fingerprint(xml_file, known=None):
+    """
+    Returns the size, mtime and SHA-256 of the export file.
+
+    Hashing a multi-GB export takes a few seconds, so when `known` already matches the
+    file's size and mtime its hash is reused instead of being recomputed.
+    """
+    stat = os.stat(xml_file)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    if known and known.get('size') == fingerprint['size'] and known.get('mtime') == fingerprint['mtime']:
+        fingerprint['sha256'] = known['sha256']
+        return fingerprint
+
+    digest = hashlib.sha256()
+    with open(xml_file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(cache_dir, manifest):
+    # Write to a temp file first so a crash never leaves a half-written manifest behind
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _type_dir(cache_dir, data_type):
+    return os.path.join(cache_dir, data_type)
+
+
+def _read_type(cache_dir, data_type, columns):
+    type_dir = _type_dir(cache_dir, data_type)
+    parts = sorted(file for file in os.listdir(type_dir) if file.endswith('.parquet'))
+    dfs = [pd.read_parquet(os.path.join(type_dir, part), columns=list(columns)) for part in parts]
+    if not dfs:
+        return _columns_to_dataframe({column: [] for column in columns})
+    return _concat_frames(dfs, columns)
+
+
+def _high_water(df):
+    """
+    Returns the newest creationDate (or startDate) of the records as an ISO string, or None.
+    """
+    if df.empty:
+        return None
+    column = 'creationDate' if 'creationDate' in df.columns else 'startDate'
+    high_water = pd.to_datetime(df[column], utc=True).max()
+    return None if pd.isna(high_water) else high_water.isoformat()
+
+
+def load_healthkit_types(xml_file, data_types, cache_dir=None, incremental=True, columns=RECORD_COLUMNS):
+    """
+    Loads several record types from the HealthKit export, backed by an on-disk Parquet store.
+
+    The store lives next to the export (`data/healthkit_cache/` by default) and holds one
+    directory of Parquet parts per record type plus a manifest keyed by the export's size,
+    mtime and content hash. When the export is unchanged nothing is parsed.
+
+    When a new export replaces the old one and `incremental` is set, the manifest's per-type
+    high-water creationDate is used to skip already stored records while streaming, and only
+    the new tail is appended as a fresh part. With `incremental=False` the store is rebuilt.
+    Types missing from the store are parsed in full during the same pass.
+
+    The store always holds `RECORD_COLUMNS`; `columns` selects which of them are loaded.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(xml_file), CACHE_DIR_NAME)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    manifest = _read_manifest(cache_dir)
+    if not manifest or manifest.get('schema') != SCHEMA_VERSION or not isinstance(manifest.get('types'), dict):
+        manifest = {'schema': SCHEMA_VERSION, 'export': None, 'types': {}}
+    fingerprint = export_fingerprint(xml_file, manifest['export'])
+    export_changed = not manifest['export'] or manifest['export']['sha256'] != fingerprint['sha256']
+    if export_changed and not incremental:
+        manifest['types'] = {}
+    manifest['export'] = fingerprint
+
+    stale = list(manifest['types']) if export_changed else []
+    missing = [data_type for data_type in data_types if data_type not in manifest['types']]
+    if stale or missing:
+        since = {
+            data_type: datetime.fromisoformat(manifest['types'][data_type]['high_water'])
+            for data_type in stale
+            if manifest['types'][data_type]['high_water']
+        }
+        for data_type, tail in parse_healthkit_types(xml_file, stale + missing, since).items():
+            entry = manifest['types'].get(data_type)
+            type_dir = _type_dir(cache_dir, data_type)
+            if entry is None:
+                shutil.rmtree(type_dir, ignore_errors=True)
+                os.makedirs(type_dir)
+                entry = manifest['types'][data_type] = {'high_water': None, 'parts': 0}
+            if tail.empty and entry['parts']:
+                continue
+            tail.to_parquet(os.path.join(type_dir, f"part-{entry['parts']:05d}.parquet"), index=False)
+            entry['parts'] += 1
+            entry['high_water'] = _high_water(tail) or entry['high_water']
+    _write_manifest(cache_dir, manifest)
+
+    return {data_type: _read_type(cache_dir, data_type, columns) for data_type in data_types}
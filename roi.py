@@ -1,8 +1,102 @@
+import numpy as np
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import datetime
-from categories import categorize_apps
+from categories import categorize_apps, categorize_domains
+
+# Weeks end on Monday and are labeled by that Monday, like pd.Grouper(freq='W-MON')
+WEEK_FREQ = 'W-MON'
+BROWSER_COLUMNS = ['Timestamp', 'Category']
+# Only read when the export has no Category column, since URLs are by far its largest column
+BROWSER_URL_COLUMN = 'URL'
+BROWSER_CHUNK_ROWS = 1_000_000
+
+def week_labels(timestamps):
+    """
+    Label of the week each timestamp falls in.
+    """
+    timestamps = pd.DatetimeIndex(timestamps)
+    if timestamps.tz is not None:
+        # Bin by local wall-clock time
+        timestamps = timestamps.tz_localize(None)
+    return timestamps.to_period(WEEK_FREQ).end_time.normalize()
+
+def _totals_to_matrix(totals, category_col):
+    matrix = totals.unstack(fill_value=0).sort_index()
+    matrix.index.name, matrix.columns.name = 'week', category_col
+    return matrix
+
+def weekly_matrix(df, time_col, category_col, value_col=None):
+    """
+    Week x category matrix of `value_col` sums, or of row counts when `value_col` is None.
+    Weeks are sorted; missing cells are 0.
+    """
+    groups = df.groupby([week_labels(df[time_col]), df[category_col]], observed=True)
+    totals = groups.size() if value_col is None else groups[value_col].sum()
+    return _totals_to_matrix(totals, category_col)
+
+def load_weekly_browsing(browser_file, chunksize=BROWSER_CHUNK_ROWS):
+    """
+    Reads a browser history CSV in chunks and returns its week x category visit counts and
+    its first rows for preview.
+
+    Only the Timestamp and Category columns are read, and each chunk is folded into running
+    per-(week, category) counts, so memory is bounded by weeks x categories plus one chunk
+    rather than by the number of visits. Exports without a Category column are categorized
+    from the domains of their URL column instead.
+    """
+    header = pd.read_csv(browser_file, nrows=0).columns
+    if hasattr(browser_file, 'seek'):
+        browser_file.seek(0)
+    columns = BROWSER_COLUMNS if 'Category' in header else ['Timestamp', BROWSER_URL_COLUMN]
+    counts, preview = None, None
+    chunks = pd.read_csv(browser_file, usecols=columns, dtype=dict.fromkeys(columns, 'str'), chunksize=chunksize)
+    for chunk in chunks:
+        if 'Category' not in chunk.columns:
+            chunk = categorize_domains(chunk, BROWSER_URL_COLUMN).rename(columns={'category': 'Category'})
+        if preview is None:
+            preview = chunk.head(20)
+        partial = chunk.groupby([week_labels(pd.to_datetime(chunk['Timestamp'])), chunk['Category']], observed=True).size()
+        counts = partial if counts is None else counts.add(partial, fill_value=0)
+    if counts is None:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='week')), pd.DataFrame(columns=BROWSER_COLUMNS)
+    return _totals_to_matrix(counts.astype('int64'), 'Category'), preview
+
+def weekly_downloads(download_data_df, weeks):
+    """
+    Downloads per week as a Series indexed by week label.
+
+    Row 0 holds the weekly downloads in columns[1:]. Column headers that are dates are mapped
+    to the week they fall in; otherwise the values are taken to be consecutive weeks starting
+    with the first screentime week.
+    """
+    values = pd.to_numeric(download_data_df.iloc[0, 1:], errors='coerce').fillna(0).to_numpy()
+    headers = pd.to_datetime(pd.Series(download_data_df.columns[1:]), errors='coerce', format='mixed')
+    if headers.notna().all():
+        index = week_labels(headers)
+    else:
+        start = weeks[0] if len(weeks) else pd.Timestamp.now().normalize()
+        index = pd.date_range(start, periods=len(values), freq=WEEK_FREQ)
+    downloads = pd.Series(values, index=index, name='downloads')
+    return downloads.groupby(level=0).sum().sort_index()
+
+def per_download(weekly, downloads):
+    """
+    Divides every column of a week x category matrix by the downloads of its week.
+    """
+    return weekly.div(downloads.reindex(weekly.index).replace(0, 1e-9), axis=0)
+
+def plot_weekly_bars(ax, matrix, label="{}", shift_days=0, bar_width=2):
+    """
+    Draws one bar series per column of a week x category matrix, each shifted three days
+    from the previous so the bars don't overlap.
+    """
+    x = matrix.index.to_numpy()[:, None] + pd.to_timedelta(shift_days + 3 * np.arange(matrix.shape[1]), unit='D').to_numpy()
+    heights = matrix.to_numpy()
+    for i, cat in enumerate(matrix.columns):
+        if matrix[cat].notna().any():
+            ax.bar(x[:, i], heights[:, i], width=bar_width, label=label.format(cat), alpha=0.7)
 
 def main():
     st.title("Weekly ROI Analysis with Screentime & Browser History")
@@ -40,103 +134,61 @@ def main():
             screentime_data = None
 
     # Download Data
-    download_values = []
+    download_data_df = None
     if download_file:
         try:
             download_data_df = pd.read_csv(download_file)
-            # Assume row 0 has the weekly downloads in columns[1:]
-            download_values = download_data_df.iloc[0, 1:].tolist()
             if st.checkbox("Show Download Raw Data"):
                 st.dataframe(download_data_df.head())
         except Exception as e:
             st.error(f"Error loading download data: {e}")
-            download_values = []
+            download_data_df = None
 
     # Browser Data
-    browser_df = None
+    # Visits per week (rows) and category (columns), aggregated while the file streams in
+    weekly_browsing = None
     if browser_file:
         try:
-            browser_df = pd.read_csv(browser_file)
-            browser_df['Timestamp'] = pd.to_datetime(browser_df['Timestamp'])
-            browser_df['date'] = browser_df['Timestamp'].dt.date
+            weekly_browsing, browser_preview = load_weekly_browsing(browser_file)
 
             if st.checkbox("Show Browser History Raw Data"):
-                st.dataframe(browser_df.head(20))
+                st.dataframe(browser_preview)
         except Exception as e:
             st.error(f"Error loading browser data: {e}")
-            browser_df = None
+            weekly_browsing = None
 
     # Need screentime + downloads to calculate ROI
-    if not (screentime_data is not None and len(download_values) > 0):
+    if not (screentime_data is not None and download_data_df is not None and download_data_df.shape[1] > 1):
         st.warning("Please upload both Screentime and Download data to see ROI analysis.")
         return
 
     # --------------------------------------------------------------------
     # 2) WEEKLY SCREENTIME & ROI
     # --------------------------------------------------------------------
-    # Group screentime by category/week
-    weekly_data = (
-        screentime_data
-        .groupby(['category', pd.Grouper(key='date', freq='W-MON')])['hours']
-        .sum()
-        .unstack(fill_value=0)
-    )
-    # Keep only columns/weeks >= start_date
-    valid_cols = [c for c in weekly_data.columns if c >= pd.to_datetime(start_date)]
-    weekly_data = weekly_data[valid_cols]
-    # Transpose so that rows=weeks, columns=categories
-    weekly_data = weekly_data.T.sort_index()
-
-    # If we have 3 rows (weeks) but 40 download points, slice downloads to length 3
-    if len(weekly_data.index) < len(download_values):
+    # Hours per week (rows) and category (columns), for the weeks from start_date on
+    weekly_data = weekly_matrix(screentime_data, 'date', 'category', 'hours')
+    weekly_data = weekly_data[weekly_data.index >= pd.to_datetime(start_date)]
+
+    downloads = weekly_downloads(download_data_df, weekly_data.index)
+    weeks = weekly_data.index.intersection(downloads.index)
+    if len(weeks) < max(len(weekly_data.index), len(downloads)):
         st.warning(
             f"We have {len(weekly_data.index)} weeks of screentime but "
-            f"{len(download_values)} download data points. "
-            "Only partial ROI can be calculated. Slicing downloads to match screentime weeks."
+            f"{len(downloads)} weeks of download data. "
+            f"Only partial ROI can be calculated, for the {len(weeks)} weeks they share."
         )
-        download_values = download_values[:len(weekly_data.index)]
-    elif len(weekly_data.index) > len(download_values):
-        # Rare case if more screentime weeks than downloads
-        weekly_data = weekly_data.iloc[:len(download_values)]
-
-    # Add a 'downloads' column
-    weekly_data['downloads'] = download_values
-    weekly_data['downloads'] = weekly_data['downloads'].replace(0, 1e-9)  # avoid div-by-zero
+    downloads = downloads.loc[weeks]
 
     # Screentime ROI (hours per download)
-    categories = [c for c in weekly_data.columns if c != 'downloads']
-    roi_data = pd.DataFrame(index=weekly_data.index)
-    for cat in categories:
-        roi_data[cat] = weekly_data[cat] / weekly_data['downloads']
+    roi_data = per_download(weekly_data.loc[weeks], downloads)
 
    # 3) WEEKLY BROWSER HISTORY AGGREGATION
-    browser_roi = pd.DataFrame()
-    if browser_df is not None:
-        # Group browser data by category and weekly
-        weekly_browsing = (
-            browser_df
-            .groupby(['Category', pd.Grouper(key='Timestamp', freq='W-MON')])
-            .size()
-            .unstack(fill_value=0)
-        )
-        
-        # Transpose so rows=weeks, columns=categories
-        weekly_browsing = weekly_browsing.T.sort_index()  # weekly_browsing.index = weekly Mondays
-        
+    browser_roi = pd.DataFrame(index=weeks)
+    if weekly_browsing is not None:
         st.write("Raw weekly_browsing (before alignment):", weekly_browsing)
-        
-        # 1) INTERSECT the weekly_browsing.index with roi_data.index (the screentime weeks)
-        common_weeks = weekly_browsing.index.intersection(weekly_data.index)
-        weekly_browsing = weekly_browsing.loc[common_weeks]
-        weekly_data_common = weekly_data.loc[common_weeks]
-
-        weekly_browsing['downloads'] = weekly_data_common['downloads'].replace(0, 1e-9)
-        
-        # 4) Finally, compute visits/download = "browser ROI"
-        browser_roi = pd.DataFrame(index=common_weeks)
-        for cat in weekly_browsing.columns.drop('downloads'):
-            browser_roi[cat] = weekly_browsing[cat] / weekly_browsing['downloads']
-        
+
+        # Compute visits/download = "browser ROI" for the screentime weeks
+        browser_roi = per_download(weekly_browsing.reindex(weeks, fill_value=0), downloads)
         st.write("browser_roi (aligned with screentime weeks):", browser_roi)
     # --------------------------------------------------------------------
     # 4) BAR CHART: SCREENTIME ROI + BROWSER ROI
@@ -159,31 +211,9 @@ def main():
         return
 
     fig, ax = plt.subplots(figsize=(12, 8))
-    bar_width = 2
-    for i, cat in enumerate(selected_categories):
-        # x-values shift so bars don’t overlap
-        x_positions = roi_data.index + pd.Timedelta(days=i*3)
-        
-        # Screentime ROI bar
-        if cat in roi_data.columns:
-            ax.bar(
-                x_positions,
-                roi_data[cat],
-                width=bar_width,
-                label=f"{cat} (Screentime)",
-                alpha=0.7
-            )
-        
-        # Browser ROI bar
-        if cat in browser_roi.columns:
-            # shift by 1 day to show side-by-side
-            ax.bar(
-                x_positions + pd.Timedelta(days=1),
-                browser_roi[cat],
-                width=bar_width,
-                label=f"{cat} (Browser)",
-                alpha=0.7
-            )
+    # Browser bars sit one day to the right of the screentime bar of the same category
+    plot_weekly_bars(ax, roi_data.reindex(columns=selected_categories), label="{} (Screentime)")
+    plot_weekly_bars(ax, browser_roi.reindex(columns=selected_categories), label="{} (Browser)", shift_days=1)
 
     ax.set_title("Weekly ROI: Screentime Hours per Download", fontsize=16)
     ax.set_xlabel("Week", fontsize=12)
@@ -214,17 +244,8 @@ def main():
     else:
         # Build a bar chart similar to your screentime chart
         fig_browser, ax_browser = plt.subplots(figsize=(12, 8))
-        bar_width = 2
-        for i, cat in enumerate(selected_browser_cats):
-            x_positions = browser_roi.index + pd.Timedelta(days=i * 3)
-            ax_browser.bar(
-                x_positions,
-                browser_roi[cat],
-                width=bar_width,
-                label=cat,
-                alpha=0.7
-            )
-        
+        plot_weekly_bars(ax_browser, browser_roi[selected_browser_cats])
+
         ax_browser.set_title("Weekly Browser ROI: Visits per Download", fontsize=16)
         ax_browser.set_xlabel("Week Start (Mon)", fontsize=12)
         ax_browser.set_ylabel("Visits per Download", fontsize=12)
@@ -248,7 +269,7 @@ def main():
         mime="text/csv",
     )
     # And optionally the browser ROI data
-    if browser_df is not None:
+    if weekly_browsing is not None:
         st.download_button(
             label="Download Browser ROI Data as CSV",
             data=convert_df_to_csv(browser_roi),
@@ -0,0 +1,244 @@
+import argparse
+import glob
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+STORE_DIR = "./data/screentime"
+# Uncompressed Arrow IPC snapshot of all parts, memory-mapped by readers
+TIMELINE_FILE = "timeline.arrow"
+# Columns that identify a single app usage event
+KEY_COLUMNS = ['app', 'start_time', 'device_id']
+TIME_COLUMNS = ['start_time', 'end_time', 'created_at']
+DEVICE_ID_DTYPE = 'string'
+
+
+def _part_paths(store_dir):
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(os.path.join(store_dir, file) for file in os.listdir(store_dir) if file.endswith(".parquet"))
+
+
+def _part_index(path):
+    return int(os.path.basename(path)[5:10])
+
+
+def normalize(df):
+    """
+    Brings an extract to the store's schema: UTC timestamps, an integer `tz` offset and a
+    nullable string `device_id`.
+
+    Legacy CSV extracts hold local wall-clock strings, so their rows are shifted back to UTC
+    using each row's `tz` offset (seconds from GMT). Timestamps are floored to whole seconds,
+    the precision of those legacy extracts, so the same event always gets the same key.
+    """
+    df = df.copy()
+    tz_offset = pd.to_numeric(df['tz'], errors='coerce') if 'tz' in df.columns else None
+    for col in TIME_COLUMNS:
+        if col not in df.columns:
+            continue
+        times = pd.to_datetime(df[col], errors='coerce')
+        if times.dt.tz is None:
+            if tz_offset is not None:
+                times = times - pd.to_timedelta(tz_offset.fillna(0), unit='s')
+            times = times.dt.tz_localize('UTC')
+        df[col] = times.dt.tz_convert('UTC').dt.floor('s').dt.as_unit('ns')
+    if tz_offset is not None:
+        df['tz'] = tz_offset.astype('Int32')
+    if 'device_id' not in df.columns:
+        df['device_id'] = None
+    # An all-empty CSV column reads as float NaN; keep the key column one dtype across extracts
+    df['device_id'] = df['device_id'].astype(DEVICE_ID_DTYPE)
+    return df.dropna(subset=['app', 'start_time'])
+
+
+def read_extract(path):
+    """
+    Reads a Screen Time extract (legacy CSV or Parquet part) in the store's schema.
+    """
+    if path.endswith(".parquet"):
+        return normalize(pd.read_parquet(path))
+    return normalize(pd.read_csv(path))
+
+
+def load(store_dir=STORE_DIR, columns=None, filters=None):
+    """
+    Loads the Screen Time store as a single DataFrame, optionally only the rows matching
+    pyarrow `filters`.
+    """
+    parts = _part_paths(store_dir)
+    if not parts:
+        return pd.DataFrame(columns=columns or KEY_COLUMNS)
+    return pd.concat([pd.read_parquet(part, columns=columns, filters=filters) for part in parts], ignore_index=True)
+
+
+def merge(df, store_dir=STORE_DIR, snapshot=True):
+    """
+    Appends the rows of `df` whose (app, start_time, device_id) key is not yet stored.
+
+    Only the key columns of stored rows no older than the extract's earliest row are read,
+    and new rows land in a fresh part, so merging the same extract twice is a no-op. Unless
+    `snapshot` is off (for a batch of merges followed by `compact`), the Arrow snapshot is
+    rebuilt afterwards. Returns the number of rows added.
+    """
+    df = normalize(df).drop_duplicates(subset=KEY_COLUMNS)
+    if df.empty:
+        return 0
+    # Stored keys older than the earliest new row cannot collide, so only read the rest
+    existing = load(store_dir, columns=KEY_COLUMNS, filters=[('start_time', '>=', df['start_time'].min())])
+    if not existing.empty:
+        existing['start_time'] = existing['start_time'].dt.as_unit('ns')
+        # Parts written before device_id had a fixed dtype may hold it as float NaN
+        existing['device_id'] = existing['device_id'].astype(DEVICE_ID_DTYPE)
+        df = df.merge(existing.drop_duplicates(), on=KEY_COLUMNS, how='left', indicator=True)
+        df = df[df['_merge'] == 'left_only'].drop(columns=['_merge'])
+    if df.empty:
+        return 0
+
+    os.makedirs(store_dir, exist_ok=True)
+    parts = _part_paths(store_dir)
+    next_index = _part_index(parts[-1]) + 1 if parts else 0
+    df.sort_values('start_time').to_parquet(os.path.join(store_dir, f"part-{next_index:05d}.parquet"), index=False)
+    # Snapshot as the writer: readers may not be allowed to write into the store directory
+    if snapshot:
+        write_timeline(store_dir)
+    return len(df)
+
+
+def compact(store_dir=STORE_DIR):
+    """
+    Rewrites all parts of the store into a single deduplicated, time-sorted part and brings
+    the Arrow snapshot up to date.
+    """
+    parts = _part_paths(store_dir)
+    if len(parts) > 1:
+        df = load(store_dir).drop_duplicates(subset=KEY_COLUMNS).sort_values('start_time')
+        # Write under a temp name, promote it to the next part and only then drop the old
+        # parts, so a crash at any point leaves every row in some part (at worst twice, which
+        # the next compaction removes)
+        tmp_path = os.path.join(store_dir, "compact.parquet.tmp")
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, os.path.join(store_dir, f"part-{_part_index(parts[-1]) + 1:05d}.parquet"))
+        for part in parts:
+            os.remove(part)
+    refresh_timeline(store_dir)
+
+
+def _parts_signature(parts):
+    return json.dumps([[os.path.basename(part), os.stat(part).st_size, os.stat(part).st_mtime_ns] for part in parts]).encode()
+
+
+def _map_timeline(path):
+    try:
+        return ipc.open_file(pa.memory_map(path)).read_all()
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+
+
+def _is_current(table, parts):
+    return table is not None and table.schema.metadata.get(b'parts') == _parts_signature(parts)
+
+
+def write_timeline(store_dir=STORE_DIR):
+    """
+    Snapshots the store into a time-sorted, uncompressed Arrow IPC file.
+
+    String columns are dictionary-encoded so every column maps to fixed-width buffers.
+    The snapshot records which parts it was built from, so `open_timeline` can tell when
+    it is stale.
+    """
+    parts = _part_paths(store_dir)
+    table = pa.Table.from_pandas(load(store_dir).sort_values('start_time', kind='stable'), preserve_index=False)
+    for index, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            table = table.set_column(index, field.name, table.column(index).dictionary_encode())
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'parts': _parts_signature(parts)})
+
+    # Replace atomically; processes that still map the old snapshot keep reading its inode
+    path = os.path.join(store_dir, TIMELINE_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def refresh_timeline(store_dir=STORE_DIR):
+    """
+    Rewrites the Arrow snapshot if it is missing or older than the Parquet parts.
+    """
+    parts = _part_paths(store_dir)
+    if parts and not _is_current(_map_timeline(os.path.join(store_dir, TIMELINE_FILE)), parts):
+        write_timeline(store_dir)
+
+
+def open_timeline(store_dir=STORE_DIR):
+    """
+    Memory-maps the store's Arrow snapshot as a pyarrow Table.
+
+    The writers (`merge` and `compact`) keep the snapshot current. If the parts changed
+    anyway, the snapshot is rebuilt here when this process may write to the store. Returns
+    None for an empty store, or when the snapshot is stale and cannot be rebuilt, e.g. because
+    the store was created by the root-run extractor.
+    """
+    parts = _part_paths(store_dir)
+    if not parts:
+        return None
+    path = os.path.join(store_dir, TIMELINE_FILE)
+    table = _map_timeline(path)
+    if not _is_current(table, parts):
+        try:
+            write_timeline(store_dir)
+        except OSError:
+            return None
+        table = _map_timeline(path)
+    return table
+
+
+def load_timeline(store_dir=STORE_DIR, columns=None):
+    """
+    Loads the store as a DataFrame backed by the memory-mapped snapshot.
+
+    Timestamp and numeric columns are zero-copy, read-only views of the file, so server
+    processes on one host share a single page-cache copy and pages are only read on access.
+    Without a usable snapshot the Parquet parts are read and sorted instead.
+    """
+    table = open_timeline(store_dir)
+    if table is None:
+        parts = _part_paths(store_dir)
+        if not parts:
+            return pd.DataFrame(columns=columns or KEY_COLUMNS)
+        if columns:
+            available = pq.read_schema(parts[0]).names
+            columns = [column for column in columns if column in available]
+        df = load(store_dir, columns=columns)
+        return df.sort_values('start_time', kind='stable', ignore_index=True) if 'start_time' in df.columns else df
+    if columns:
+        table = table.select([column for column in columns if column in table.column_names])
+    return table.to_pandas(split_blocks=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the consolidated Screen Time store.")
+    parser.add_argument("--store", default=STORE_DIR, help="Store directory (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    merge_parser = commands.add_parser("merge", help="Ingest Screen Time extract files (CSV or Parquet) into the store")
+    merge_parser.add_argument("files", nargs="*", help="Extract files (default: every CSV extract in ./data)")
+    commands.add_parser("compact", help="Rewrite the store into a single deduplicated part")
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        files = args.files or sorted(glob.glob("./data/screentime_data_*.csv"))
+        for path in files:
+            added = merge(read_extract(path), args.store, snapshot=False)
+            print(f"{path}: {added} new rows")
+        compact(args.store)
+    elif args.command == "compact":
+        compact(args.store)
+    print(f"Store {args.store} holds {len(load(args.store, columns=['app']))} rows")
+
+
+if __name__ == "__main__":
+    main()
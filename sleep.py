@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+from health_timeline import HOUR_NS, to_ns
+
+# HealthKit sleep analysis codes (see healthkit.CATEGORY_VALUE_CODES)
+IN_BED = 0
+ASLEEP_UNSPECIFIED = 1
+AWAKE = 2
+ASLEEP_CORE = 3
+ASLEEP_DEEP = 4
+ASLEEP_REM = 5
+ASLEEP_VALUES = (ASLEEP_UNSPECIFIED, ASLEEP_CORE, ASLEEP_DEEP, ASLEEP_REM)
+STAGE_COLUMNS = {
+    ASLEEP_CORE: 'core',
+    ASLEEP_DEEP: 'deep',
+    ASLEEP_REM: 'rem',
+    ASLEEP_UNSPECIFIED: 'unspecified',
+    AWAKE: 'awake',
+}
+
+# A night labeled D covers local time [D-1 18:00, D 18:00), i.e. it is named after the wake-up day
+DEFAULT_CUTOFF_HOUR = 18
+# Sources whose name contains an earlier entry win; anything else ranks last
+DEFAULT_SOURCE_PRIORITY = ('Watch', 'iPhone')
+
+
+def night_of(times, cutoff_hour=DEFAULT_CUTOFF_HOUR, timezone=None):
+    """
+    Night (as a date) each UTC timestamp belongs to: samples before the cutoff hour local
+    time belong to that day's night, later ones to the next day's.
+    """
+    local = times.dt.tz_convert(timezone or tzlocal()).dt.tz_localize(None)
+    return (local - pd.Timedelta(hours=cutoff_hour)).dt.date + pd.Timedelta(days=1)
+
+
+def source_ranks(sources, source_priority=DEFAULT_SOURCE_PRIORITY):
+    """
+    Priority rank of each source name (lower wins), matching `source_priority` entries as
+    case-insensitive substrings.
+    """
+    sources = pd.Series(sources, dtype='str').fillna('')
+    ranks = np.full(len(sources), len(source_priority))
+    for rank, pattern in reversed(list(enumerate(source_priority))):
+        ranks[sources.str.contains(pattern, case=False, regex=False).to_numpy()] = rank
+    return ranks
+
+
+def merge_intervals(groups, starts, ends):
+    """
+    Unions the [start, end) intervals within each group.
+
+    `groups`, `starts` and `ends` are equal-length int64 arrays. Returns the group, start and
+    end of every merged interval, sorted by group and start. One sort, so O(n log n).
+    """
+    order = np.lexsort((starts, groups))
+    groups, starts, ends = groups[order], starts[order], ends[order]
+    if len(groups) == 0:
+        return groups, starts, ends
+    # Furthest end reached so far within the group; an interval starting past it opens a new run
+    running_end = pd.Series(ends).groupby(groups).cummax().to_numpy()
+    new_run = np.ones(len(groups), dtype=bool)
+    new_run[1:] = (groups[1:] != groups[:-1]) | (starts[1:] > running_end[:-1])
+    run_starts = np.flatnonzero(new_run)
+    return groups[run_starts], starts[run_starts], np.maximum.reduceat(ends, run_starts)
+
+
+def _union_hours(groups, starts, ends, n_groups):
+    merged_groups, merged_starts, merged_ends = merge_intervals(groups, starts, ends)
+    return np.bincount(merged_groups, (merged_ends - merged_starts) / HOUR_NS, minlength=n_groups)
+
+
+def sleep_nights(sleep_df, cutoff_hour=DEFAULT_CUTOFF_HOUR, timezone=None, source_priority=DEFAULT_SOURCE_PRIORITY):
+    """
+    Summarizes HealthKit sleep analysis samples into one row per night.
+
+    Each night only keeps the samples of its highest-priority source (ranked separately for
+    in-bed and sleep-stage samples), so a Watch and a third-party app tracking the same night
+    are not added up, and overlapping samples are merged before their time is summed. Columns:
+
+    - `date`: the night (named after the wake-up day, see `night_of`)
+    - `duration`: hours asleep (union of all asleep stages)
+    - `in_bed`: hours in bed
+    - `core`, `deep`, `rem`, `unspecified`, `awake`: hours per stage
+    - `bedtime`, `wake_time`: first and last asleep moment (UTC)
+    - `source`: the source the night's sleep stages were taken from
+    """
+    columns = ['date', 'duration', 'in_bed', *STAGE_COLUMNS.values(), 'bedtime', 'wake_time', 'source']
+    sleep_df = sleep_df.dropna(subset=['startDate', 'endDate', 'value'])
+    sleep_df = sleep_df[sleep_df['endDate'] > sleep_df['startDate']]
+    if sleep_df.empty:
+        return pd.DataFrame(columns=columns)
+
+    nights, night_index = np.unique(night_of(sleep_df['startDate'], cutoff_hour, timezone).to_numpy(), return_inverse=True)
+    sources = sleep_df['sourceName'] if 'sourceName' in sleep_df.columns else pd.Series('', index=sleep_df.index)
+    values = sleep_df['value'].to_numpy()
+    starts, ends = to_ns(sleep_df['startDate']), to_ns(sleep_df['endDate'])
+
+    # Keep, per night, only the samples of the best-ranked source present that night. In-bed
+    # time is ranked on its own since it often comes from a different device than the stages.
+    ranks = source_ranks(sources, source_priority)
+    rank_group = night_index * 2 + (values == IN_BED)
+    best_rank = np.full(len(nights) * 2, np.iinfo(np.int64).max)
+    np.minimum.at(best_rank, rank_group, ranks)
+    keep = ranks == best_rank[rank_group]
+    night_index, values, starts, ends = night_index[keep], values[keep], starts[keep], ends[keep]
+    sources = sources.astype('str').to_numpy()[keep]
+
+    n_nights = len(nights)
+    asleep = np.isin(values, ASLEEP_VALUES)
+    table = {
+        'date': nights,
+        'duration': _union_hours(night_index[asleep], starts[asleep], ends[asleep], n_nights),
+        'in_bed': _union_hours(night_index[values == IN_BED], starts[values == IN_BED], ends[values == IN_BED], n_nights),
+    }
+    for value, column in STAGE_COLUMNS.items():
+        stage = values == value
+        table[column] = _union_hours(night_index[stage], starts[stage], ends[stage], n_nights)
+
+    bedtime = np.full(n_nights, np.iinfo(np.int64).max)
+    wake_time = np.full(n_nights, np.iinfo(np.int64).min)
+    np.minimum.at(bedtime, night_index[asleep], starts[asleep])
+    np.maximum.at(wake_time, night_index[asleep], ends[asleep])
+    has_sleep = np.bincount(night_index[asleep], minlength=n_nights) > 0
+    # The kept stage samples of a night all come from sources of the same rank; report the first
+    stage_nights, first_stage = np.unique(night_index[values != IN_BED], return_index=True)
+    source = np.full(n_nights, None, dtype=object)
+    source[stage_nights] = sources[values != IN_BED][first_stage]
+
+    for column in ['duration', 'in_bed', *STAGE_COLUMNS.values()]:
+        table[column] = table[column].astype(np.float32)
+    table['bedtime'] = pd.to_datetime(np.where(has_sleep, bedtime, np.iinfo(np.int64).min).view('datetime64[ns]'), utc=True)
+    table['wake_time'] = pd.to_datetime(np.where(has_sleep, wake_time, np.iinfo(np.int64).min).view('datetime64[ns]'), utc=True)
+    table['source'] = pd.Categorical(source)
+    return pd.DataFrame(table, columns=columns)
@@ -1,16 +1,38 @@
 import sqlite3
 import pandas as pd
 import os
-from datetime import datetime
+import sys
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import screentime_store
 # Path to the Screen Time database
 db_path = os.path.expanduser('~/Library/Application Support/Knowledge/knowledgeC.db')
 
-# Convert Unix timestamp to human-readable date
-def unix_to_date(unix_timestamp):
+# Consolidated Screen Time store that each run merges into, plus the cursor of the last extracted row
+store_dir = '../data/screentime'
+cursor_path = '../data/screentime_cursor.json'
+
+# Latest timestamp accepted as valid (2100-01-01 UTC)
+MAX_UNIX_TIMESTAMP = 4102444800
+
+# Read the (ZCREATIONDATE, Z_PK) cursor left by the previous run, in Cocoa epoch seconds
+def load_cursor():
     try:
-        return datetime.fromtimestamp(unix_timestamp).strftime('%Y-%m-%d %H:%M:%S')
-    except (OSError, OverflowError, ValueError):
-        return None
+        with open(cursor_path) as f:
+            cursor = json.load(f)
+        return cursor['created_at'], cursor['id']
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+def save_cursor(created_at, row_id):
+    with open(cursor_path, 'w') as f:
+        json.dump({'created_at': created_at, 'id': row_id}, f)
+
+# Convert a column of Unix timestamps to UTC datetimes, masking missing or out-of-range values as NaT
+def unix_to_datetime(unix_timestamps):
+    seconds = pd.to_numeric(unix_timestamps, errors='coerce')
+    seconds = seconds.where((seconds > 978307200) & (seconds < MAX_UNIX_TIMESTAMP))
+    return pd.to_datetime(seconds, unit='s', utc=True)
 
 # Check if the database file exists
 if not os.path.exists(db_path):
@@ -20,9 +42,11 @@ else:
         # Connect to the SQLite database
         conn = sqlite3.connect(db_path)
 
-        # Provided query
+        # Provided query, restricted to rows newer than the cursor
         query = """
         SELECT
+            ZOBJECT.Z_PK AS "id",
+            ZOBJECT.ZCREATIONDATE AS "cursor_created_at",
             ZOBJECT.ZVALUESTRING AS "app", 
             (ZOBJECT.ZENDDATE - ZOBJECT.ZSTARTDATE) AS "usage",
             (ZOBJECT.ZSTARTDATE + 978307200) as "start_time", 
@@ -44,21 +68,39 @@ else:
             ON ZSOURCE.ZDEVICEID = ZSYNCPEER.ZDEVICEID
         WHERE
             ZSTREAMNAME = "/app/usage"
+            AND (
+                ? IS NULL
+                OR ZOBJECT.ZCREATIONDATE > ?
+                OR (ZOBJECT.ZCREATIONDATE = ? AND ZOBJECT.Z_PK > ?)
+            )
         ORDER BY
-            ZSTARTDATE DESC
+            ZOBJECT.ZCREATIONDATE, ZOBJECT.Z_PK
         """
 
-        # Load the data into a pandas DataFrame
-        df = pd.read_sql_query(query, conn)
+        # Load only the rows added since the last run into a pandas DataFrame
+        cursor_created_at, cursor_id = load_cursor()
+        df = pd.read_sql_query(query, conn, params=(cursor_created_at, cursor_created_at, cursor_created_at, cursor_id))
+
+        if df.empty:
+            print("No new Screen Time data since the last extraction.")
+            conn.close()
+            raise SystemExit(0)
+
+        # Advance the cursor before dropping invalid rows so they are not fetched again
+        last_row = df.iloc[-1]
+        new_cursor = (float(last_row['cursor_created_at']), int(last_row['id']))
+        df = df.drop(columns=['cursor_created_at'])
 
         # Print the first few rows of the DataFrame to verify data
         print("Initial data loaded:")
         print(df.head())
 
-        # Convert Unix timestamps to human-readable dates
-        df['start_time'] = df['start_time'].apply(unix_to_date)
-        df['end_time'] = df['end_time'].apply(unix_to_date)
-        df['created_at'] = df['created_at'].apply(unix_to_date)
+        # Convert Unix timestamps to timezone-aware UTC datetimes; `tz` keeps each row's offset
+        # (seconds from GMT) so local wall-clock time can be recovered
+        df['start_time'] = unix_to_datetime(df['start_time'])
+        df['end_time'] = unix_to_datetime(df['end_time'])
+        df['created_at'] = unix_to_datetime(df['created_at'])
+        df['tz'] = pd.to_numeric(df['tz'], errors='coerce').astype('Int32')
 
         # Print the data after date conversion
         print("Data after date conversion:")
@@ -74,15 +116,11 @@ else:
         print("Final data before exporting:")
         print(df.head())
 
-        # Save to CSV
-        csv_path = f'../data/screentime_data_{datetime.now()}.csv'
-        df.to_csv(csv_path, index=False)
-        print(f"Screen Time data has been exported to {csv_path}")
+        # Merge into the store; rows already present under the same (app, start_time, device_id) are skipped
+        added = screentime_store.merge(df, store_dir)
+        print(f"{added} new Screen Time rows have been merged into {store_dir}")
 
-        # Save to JSON
-        json_path = f'../data/screentime_data_{datetime.now()}.json'
-        df.to_json(json_path, orient='records', lines=True)
-        print(f"Screen Time data has been exported to {json_path}")
+        save_cursor(*new_cursor)
 
     except sqlite3.OperationalError as e:
         print(f"An error occurred: {e}")